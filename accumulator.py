@@ -0,0 +1,186 @@
+from array import array
+from operator import itemgetter
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Mapping, Tuple
+
+# 排序键, 通常为 (finish_time, 行号), 只在同一个累加器内相互比较
+Order = Any
+
+
+class DenseKeys:
+    """键到稠密下标的映射, 由同一索引下的全部累加器共享, 遇到新键时追加"""
+
+    __slots__ = ("keys", "ids")
+
+    def __init__(self, keys: Iterable[Hashable] = ()) -> None:
+        self.keys: List[Hashable] = []
+        self.ids: Dict[Hashable, int] = {}
+
+        for key in keys:
+            self.id(key)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def id(self, key: Hashable) -> int:
+        if (i := self.ids.get(key)) is None:
+            i = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+
+        return i
+
+
+class OrderedCounter:
+    """
+    与 Counter 相同的计数, 另记录每个键最早出现时的排序键.
+    输出按最早出现的先后排列, 与先排序再逐行累加 Counter 的结果一致,
+    因此数据可以按任意顺序加入, 分片结果也可以直接合并.
+    """
+
+    __slots__ = ("counts", "first")
+
+    def __init__(self) -> None:
+        self.counts: Dict[Hashable, int] = {}
+        self.first: Dict[Hashable, Order] = {}
+
+    def add(self, key: Hashable, count: int, order: Order) -> None:
+        if (first := self.first.get(key)) is None:
+            self.counts[key] = count
+            self.first[key] = order
+            return
+
+        self.counts[key] += count
+
+        if order < first:
+            self.first[key] = order
+
+    def merge(self, other: "OrderedCounter") -> None:
+        for key, count in other.counts.items():
+            self.add(key, count, other.first[key])
+
+    def __getitem__(self, key: Hashable) -> int:
+        return self.counts.get(key, 0)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(sorted(self.counts, key=self.first.__getitem__))
+
+    def items(self) -> Iterator[Tuple[Hashable, int]]:
+        counts = self.counts
+
+        return ((key, counts[key]) for key in self)
+
+    def most_common(self) -> List[Tuple[Hashable, int]]:
+        return sorted(self.items(), key=itemgetter(1), reverse=True)
+
+
+class DenseCounter(OrderedCounter):
+    """
+    键集合固定且较小的 OrderedCounter, 计数保存在以共享下标索引的定长整数数组中,
+    逐团队累加时原地更新, 不产生新的对象.
+    """
+
+    __slots__ = ("keys", "seen")
+
+    def __init__(self, keys: DenseKeys | None = None) -> None:
+        self.keys = keys if keys is not None else DenseKeys()
+
+        self.counts = array("q", bytes(8 * len(self.keys)))
+        self.first: List[Order] = [None] * len(self.keys)
+        self.seen: List[int] = []
+
+    def grow(self) -> None:
+        # 共享的键表在其他累加器中新增了键
+        size = len(self.keys) - len(self.counts)
+
+        self.counts.frombytes(bytes(8 * size))
+        self.first.extend([None] * size)
+
+    def add_id(self, i: int, count: int, order: Order) -> None:
+        if i >= len(self.counts):
+            self.grow()
+
+        if (first := self.first[i]) is None:
+            self.first[i] = order
+            self.seen.append(i)
+        elif order < first:
+            self.first[i] = order
+
+        self.counts[i] += count
+
+    def add(self, key: Hashable, count: int, order: Order) -> None:
+        self.add_id(self.keys.id(key), count, order)
+
+    def update(self, counter: Mapping[Hashable, int], order: Order) -> None:
+        """同一次加入的多个键共享 order, 以其在 counter 中的先后区分"""
+        ids = self.keys.ids
+
+        for rank, (key, count) in enumerate(counter.items()):
+            if (i := ids.get(key)) is None:
+                i = self.keys.id(key)
+
+            self.add_id(i, count, (order, rank))
+
+    def merge(self, other: "DenseCounter") -> None:
+        for i in other.seen:
+            self.add(other.keys.keys[i], other.counts[i], other.first[i])
+
+    def __getitem__(self, key: Hashable) -> int:
+        i = self.keys.ids.get(key)
+
+        return self.counts[i] if i is not None and i < len(self.counts) else 0
+
+    def __len__(self) -> int:
+        return len(self.seen)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        keys = self.keys.keys
+
+        return (keys[i] for i in sorted(self.seen, key=self.first.__getitem__))
+
+    def items(self) -> Iterator[Tuple[Hashable, int]]:
+        keys, counts = self.keys.keys, self.counts
+
+        return (
+            (keys[i], counts[i]) for i in sorted(self.seen, key=self.first.__getitem__)
+        )
+
+
+class TopK:
+    """
+    保留排序键最小的 k 个值. 缓冲区达到 2k 时排序并截断,
+    之后排序键不小于第 k 个的值直接丢弃, 均摊每次插入 O(log k).
+    """
+
+    __slots__ = ("k", "entries", "bound")
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+        self.entries: List[Tuple[Order, Any]] = []
+        self.bound: Order = None
+
+    def add(self, order: Order, value: Any) -> None:
+        if self.bound is not None and order >= self.bound:
+            return
+
+        self.entries.append((order, value))
+
+        if len(self.entries) >= 2 * self.k:
+            self.truncate()
+
+    def truncate(self) -> None:
+        self.entries.sort(key=itemgetter(0))
+        del self.entries[self.k :]
+
+        self.bound = self.entries[-1][0]
+
+    def merge(self, other: "TopK") -> None:
+        for order, value in other.entries:
+            self.add(order, value)
+
+    def __len__(self) -> int:
+        return min(len(self.entries), self.k)
+
+    def values(self) -> List[Any]:
+        return [value for _, value in sorted(self.entries, key=itemgetter(0))[: self.k]]
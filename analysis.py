@@ -0,0 +1,744 @@
+import json
+from array import array
+from collections import Counter, defaultdict
+from csv import DictReader
+from functools import partial
+from itertools import islice
+from operator import itemgetter
+from sys import intern
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+from accumulator import DenseCounter, DenseKeys, Order, OrderedCounter, TopK
+from catalog import MountCatalog, Team
+from cube import Cube
+from profiler import PROFILER
+from record import Record
+from robust import filtered_means, percentiles
+from sketch import QuantileSketch
+
+# 映射表文件, 需要预先下载到工作目录
+MAPPING_FILES = ("mount_group.json", "school.json")
+
+# 前 N 个击杀只需保留到最大的榜单长度
+TOP_N = 100
+
+# 流式读取时每批处理的行数
+CHUNK_SIZE = 10000
+
+# 各项平均数据统计所使用的心法分组
+STAT_MOUNT_GROUPS = {
+    "dps": ("外攻", "内攻"),
+    "damage": ("外攻", "内攻"),
+    "hps": ("治疗",),
+    "therapy": ("治疗",),
+}
+
+
+# 团长行聚合字段, 与 BossGroup 的属性同名
+LEADER_FIELDS = (
+    "leader_server",
+    "server_count",
+    "force_count",
+    "mount_count",
+    "hps_count",
+    "tank_count",
+    "mount_type_count",
+    "leader_mount_group",
+    "lineup_count",
+)
+
+FIELDS = frozenset(LEADER_FIELDS + tuple(STAT_MOUNT_GROUPS))
+
+# 不属于任何指标的可选字段, 加入 fields 时在同一次遍历中构建 (BOSS, 区服, 心法) 立方体
+CUBE_FIELD = "cube"
+
+# 可选字段, 加入 fields 时各项数值以固定大小的分位数草图代替全部样本
+SKETCH_FIELD = "sketch"
+
+# 分位数指标输出的百分位
+PERCENTILES = (25, 50, 75, 95)
+
+# 按各键最早出现的排序键输出的计数器
+ORDERED_COUNTERS = (
+    "server_count",
+    "force_count",
+    "mount_count",
+    "hps_count",
+    "tank_count",
+    "leader_mount_group",
+    "lineup_count",
+)
+
+
+class BossGroup:
+    def __init__(
+        self,
+        mount_keys: DenseKeys | None = None,
+        force_keys: DenseKeys | None = None,
+        sketch: bool = False,
+    ) -> None:
+        # 计数均记录各键最早出现的 (finish_time, 行号), 数据无需预先排序
+        self.leader_server = TopK(TOP_N)
+
+        self.server_count = OrderedCounter()
+        # 门派与心法的键集合固定且较小, 以共享下标的整数数组原地累加
+        self.force_count = DenseCounter(force_keys)
+        self.mount_count = DenseCounter(mount_keys)
+        self.hps_count = OrderedCounter()
+        self.tank_count = OrderedCounter()
+        self.mount_type_count = Counter({"外攻": 0, "内攻": 0})
+        self.leader_mount_group = OrderedCounter()
+        # 以阵容签名计数, 相同心法组成的团队合并为一项
+        self.lineup_count = OrderedCounter()
+
+        # 样本以 double 数组保存, 每个值 8 字节, 不为每个样本创建 float 对象;
+        # sketch 模式下保存可合并的分位数草图, 内存与团队数无关, 平均值为近似值
+        self.sketch = sketch
+        self.stat: Dict[str, Dict[int, array | QuantileSketch]] = {
+            stat: defaultdict(QuantileSketch if sketch else partial(array, "d"))
+            for stat in STAT_MOUNT_GROUPS
+        }
+
+    def add_leader(
+        self,
+        team: dict,
+        mount_group_name: str | None,
+        order: Order,
+        fields: Set[str] = FIELDS,
+    ) -> None:
+        if "leader_server" in fields:
+            self.leader_server.add(order, team["server"])
+
+        if "server_count" in fields:
+            self.server_count.add(team["server"], 1, order)
+        if "force_count" in fields:
+            self.force_count.update(team["force_count"], order)
+        if "mount_count" in fields:
+            self.mount_count.update(team["mount_count"], order)
+        if "hps_count" in fields:
+            self.hps_count.add(team["hps_count"], 1, order)
+        if "tank_count" in fields:
+            self.tank_count.add(team["tank_count"], 1, order)
+        if "mount_type_count" in fields:
+            self.mount_type_count["外攻"] += team["外攻"]
+            self.mount_type_count["内攻"] += team["内攻"]
+        if "leader_mount_group" in fields:
+            self.leader_mount_group.add(mount_group_name, 1, order)
+        if "lineup_count" in fields:
+            self.lineup_count.add(team["lineup"], 1, order)
+
+    def add_stat(self, stat: str, mount_id: int, value: float) -> None:
+        self.stat[stat][mount_id].append(value)
+
+    def merge(self, other: "BossGroup") -> None:
+        """计数器记录了各键最早出现的排序键, 合并结果与按顺序逐行累加一致"""
+        self.leader_server.merge(other.leader_server)
+
+        for attr in ORDERED_COUNTERS:
+            getattr(self, attr).merge(getattr(other, attr))
+
+        self.mount_type_count.update(other.mount_type_count)
+
+        for stat, samples in other.stat.items():
+            for mount_id, values in samples.items():
+                if self.sketch:
+                    self.stat[stat][mount_id].merge(values)
+                else:
+                    self.stat[stat][mount_id].extend(values)
+
+
+class GroupIndex:
+    """按 achieve_id 分组的单次遍历聚合索引, "all" 分组包含全部数据"""
+
+    def __init__(
+        self,
+        mount_group: dict,
+        mount_id_to_mount_group: dict,
+        fields: Set[str] = FIELDS,
+    ) -> None:
+        self.mount_group = mount_group
+        self.mount_id_to_mount_group = mount_id_to_mount_group
+
+        # 只累加所需指标依赖的字段
+        self.fields = frozenset(fields)
+        self.leader_fields = self.fields.intersection(LEADER_FIELDS)
+
+        self.stat_mounts = {
+            stat: {
+                mount_id
+                for group in groups
+                for mount_id in mount_group["mount_group"][group]
+            }
+            for stat, groups in STAT_MOUNT_GROUPS.items()
+            if stat in self.fields
+        }
+
+        self.mount_keys = DenseKeys(mount_id_to_mount_group)
+        self.force_keys = DenseKeys()
+
+        self.all = self.new_group()
+        self.groups: Dict[str, BossGroup] = {}
+
+        # 已加入的团长行数, 作为同一 finish_time 内的先后顺序
+        self.leaders = 0
+
+        self.cube = Cube(STAT_MOUNT_GROUPS) if CUBE_FIELD in self.fields else None
+
+    def new_group(self) -> BossGroup:
+        return BossGroup(self.mount_keys, self.force_keys, SKETCH_FIELD in self.fields)
+
+    def group(self, boss: str) -> BossGroup:
+        return self.groups.get(boss) or self.new_group()
+
+    def boss_group(self, boss: str) -> BossGroup:
+        if (boss_group := self.groups.get(boss)) is None:
+            boss_group = self.groups[boss] = self.new_group()
+
+        return boss_group
+
+    def add(self, line: dict, part: int | None = None) -> None:
+        """分块并行聚合时传入 part, 团长行的顺序记为 (part, 块内序号)"""
+        if line["is_leader"] == "1":
+            self.leaders += 1
+
+        self.update(
+            line,
+            self.leaders if part is None else (part, self.leaders),
+            self.all,
+            self.boss_group(line["achieve_id"]),
+        )
+
+        if self.cube is not None:
+            self.cube.add(line)
+
+    def merge(self, other: "GroupIndex") -> None:
+        self.all.merge(other.all)
+
+        for boss, group in other.groups.items():
+            self.boss_group(boss).merge(group)
+
+        if self.cube is not None and other.cube is not None:
+            self.cube.merge(other.cube)
+
+    def update(self, line: dict, position: int, *groups: BossGroup) -> None:
+        """position 为行在输入中的先后顺序, 与 finish_time 共同决定排序"""
+        if line["is_leader"] == "1" and self.leader_fields:
+            mount_group_name = (
+                self.mount_id_to_mount_group[line["mount"]]
+                if "leader_mount_group" in self.leader_fields
+                else None
+            )
+            order = (line["finish_time"], position)
+
+            for group in groups:
+                group.add_leader(line, mount_group_name, order, self.leader_fields)
+
+        for stat, mounts in self.stat_mounts.items():
+            if (value := line[stat]) is not None and line["mount"] in mounts:
+                for group in groups:
+                    group.add_stat(stat, line["mount"], value)
+
+
+def rank(counter: Counter | OrderedCounter) -> dict:
+    items = counter.most_common()
+
+    return {
+        "item": list(map(itemgetter(0), items)),
+        "value": list(map(itemgetter(1), items)),
+    }
+
+
+def select_mount(counter: DenseCounter, mount_ids: List[int]) -> Counter:
+    return Counter({mount_id: counter[mount_id] for mount_id in mount_ids})
+
+
+def rank_mount_stat(group: BossGroup, stat: str, mount_ids: List[int]) -> Counter:
+    if group.sketch:
+        return Counter(
+            {
+                mount_id: samples.iqr_mean()
+                for mount_id in mount_ids
+                if (samples := group.stat[stat].get(mount_id)) is not None
+            }
+        )
+
+    return Counter(filtered_means(group.stat[stat], mount_ids))
+
+
+def rank_mount_percentile(
+    group: BossGroup, stat: str, mount_ids: List[int], percentile: int
+) -> Counter:
+    """sketch 模式下为草图估计的近似值, 否则为全部样本的精确值"""
+    result = Counter()
+
+    for mount_id in mount_ids:
+        if (samples := group.stat[stat].get(mount_id)) is not None and len(samples):
+            if group.sketch:
+                result[mount_id] = samples.percentiles((percentile,))[0]
+            else:
+                result[mount_id] = percentiles(samples, (percentile,))[0]
+
+    return result
+
+
+# 指标注册表, 按注册顺序输出; METRIC_FIELDS 记录各指标依赖的聚合字段,
+# OPTIONAL_METRICS 中的指标只在显式指定时输出
+METRICS: Dict[str, Callable[["BossGroup", dict], Counter | OrderedCounter]] = {}
+METRIC_FIELDS: Dict[str, Tuple[str, ...]] = {}
+OPTIONAL_METRICS: List[str] = []
+
+
+def metric(*fields: str, optional: bool = False):
+    def register(func):
+        METRICS[func.__name__] = func
+        METRIC_FIELDS[func.__name__] = fields
+
+        if optional:
+            OPTIONAL_METRICS.append(func.__name__)
+
+        return func
+
+    return register
+
+
+def resolve_metrics(metrics: Iterable[str] | None = None) -> List[str]:
+    if metrics is None:
+        return [name for name in METRICS if name not in OPTIONAL_METRICS]
+
+    metrics = set(metrics)
+
+    if unknown := metrics - METRICS.keys():
+        raise ValueError(f"unknown metrics: {', '.join(sorted(unknown))}")
+
+    return [name for name in METRICS if name in metrics]
+
+
+def metric_fields(metrics: Iterable[str]) -> Set[str]:
+    return {field for name in metrics for field in METRIC_FIELDS[name]}
+
+
+##################################
+# 前 10 个击杀 BOSS 的团队区服统计 #
+##################################
+@metric("leader_server")
+def top10_achieve_team_count(group: BossGroup, mount_group: dict) -> Counter:
+    return Counter(group.leader_server.values()[:10])
+
+
+###################################
+# 前 100 个击杀 BOSS 的团队区服统计 #
+###################################
+@metric("leader_server")
+def top100_achieve_team_count(group: BossGroup, mount_group: dict) -> Counter:
+    return Counter(group.leader_server.values()[:100])
+
+
+###################
+# 入榜团队数量统计 #
+###################
+@metric("server_count")
+def server_rank_team_count(group: BossGroup, mount_group: dict) -> OrderedCounter:
+    return group.server_count
+
+
+###############
+# 门派出场统计 #
+###############
+@metric("force_count")
+def force_attendance_count(group: BossGroup, mount_group: dict) -> DenseCounter:
+    return group.force_count
+
+
+###############
+# 心法出场统计 #
+###############
+@metric("mount_count")
+def mount_attendance_count(group: BossGroup, mount_group: dict) -> DenseCounter:
+    return group.mount_count
+
+
+###################
+# 治疗心法个数统计 #
+###################
+@metric("hps_count")
+def hps_count(group: BossGroup, mount_group: dict) -> OrderedCounter:
+    return group.hps_count
+
+
+###################
+# 治疗心法出场统计 #
+###################
+@metric("mount_count")
+def hps_attendance_count(group: BossGroup, mount_group: dict) -> Counter:
+    return select_mount(group.mount_count, mount_group["mount_group"]["治疗"])
+
+
+###################
+# 防御心法个数统计 #
+###################
+@metric("tank_count")
+def tank_count(group: BossGroup, mount_group: dict) -> OrderedCounter:
+    return group.tank_count
+
+
+###################
+# 防御心法出场统计 #
+###################
+@metric("mount_count")
+def tank_attendance_count(group: BossGroup, mount_group: dict) -> Counter:
+    return select_mount(group.mount_count, mount_group["mount_group"]["坦克"])
+
+
+###############
+# 输出心法统计 #
+###############
+@metric("mount_count")
+def dps_count(group: BossGroup, mount_group: dict) -> Counter:
+    return select_mount(
+        group.mount_count,
+        mount_group["mount_group"]["外攻"] + mount_group["mount_group"]["内攻"],
+    )
+
+
+#################
+# 内外功出场统计 #
+#################
+@metric("mount_type_count")
+def mount_type_attendance_count(group: BossGroup, mount_group: dict) -> Counter:
+    return group.mount_type_count
+
+
+###################
+# 团长心法类型统计 #
+###################
+@metric("leader_mount_group")
+def leader_mount_type_count(group: BossGroup, mount_group: dict) -> OrderedCounter:
+    return group.leader_mount_group
+
+
+###################
+# 输出心法平均 DPS #
+###################
+@metric("dps")
+def rank_mount_dps(group: BossGroup, mount_group: dict) -> Counter:
+    return rank_mount_stat(
+        group,
+        "dps",
+        mount_group["mount_group"]["外攻"] + mount_group["mount_group"]["内攻"],
+    )
+
+
+#####################
+# 输出心法平均伤害量 #
+#####################
+@metric("damage")
+def rank_mount_damage(group: BossGroup, mount_group: dict) -> Counter:
+    return rank_mount_stat(
+        group,
+        "damage",
+        mount_group["mount_group"]["外攻"] + mount_group["mount_group"]["内攻"],
+    )
+
+
+###################
+# 治疗心法平均 HPS #
+###################
+@metric("hps")
+def rank_mount_hps(group: BossGroup, mount_group: dict) -> Counter:
+    return rank_mount_stat(group, "hps", mount_group["mount_group"]["治疗"])
+
+
+#####################
+# 治疗心法平均治疗量 #
+#####################
+@metric("therapy")
+def rank_mount_therapy(group: BossGroup, mount_group: dict) -> Counter:
+    return rank_mount_stat(group, "therapy", mount_group["mount_group"]["治疗"])
+
+
+###############
+# 阵容组合统计 #
+###############
+@metric("lineup_count", optional=True)
+def lineup_count(group: BossGroup, mount_group: dict) -> Counter:
+    # 不同阵容的数量与团队数相当, 只输出最常见的前 TOP_N 个
+    return Counter(dict(group.lineup_count.most_common()[:TOP_N]))
+
+
+########################
+# 各项数值的心法分位数 #
+########################
+def percentile_metric(stat: str, percentile: int) -> Callable:
+    def func(group: BossGroup, mount_group: dict) -> Counter:
+        mount_ids = [
+            mount_id
+            for name in STAT_MOUNT_GROUPS[stat]
+            for mount_id in mount_group["mount_group"][name]
+        ]
+
+        return rank_mount_percentile(group, stat, mount_ids, percentile)
+
+    func.__name__ = f"rank_mount_{stat}_p{percentile}"
+
+    return func
+
+
+PERCENTILE_METRICS = [
+    metric(stat, optional=True)(percentile_metric(stat, percentile)).__name__
+    for stat in STAT_MOUNT_GROUPS
+    for percentile in PERCENTILES
+]
+
+
+def build_response(
+    index: GroupIndex, boss_lst: List[str], metrics: Iterable[str] | None = None
+) -> dict:
+    response = {}
+
+    for name in resolve_metrics(metrics):
+        func = METRICS[name]
+
+        with PROFILER.stage(f"metric:{name}"):
+            response[name] = {"all": rank(func(index.all, index.mount_group))}
+
+            for boss in boss_lst:
+                response[name][boss] = rank(func(index.group(boss), index.mount_group))
+
+    return response
+
+
+def analyze(
+    rows: Iterable[dict],
+    bosses: List[str],
+    metrics: Iterable[str] | None = None,
+    mapping: Tuple[dict, dict, dict] | None = None,
+) -> dict:
+    """
+    对 load() 解析后的行计算指定指标, 默认计算全部指标.
+    只会累加所选指标依赖的字段, mapping 缺省时从工作目录读取映射表.
+    """
+    metrics = resolve_metrics(metrics)
+
+    mount_group, _, mount_id_to_mount_group = mapping or load_mapping()
+
+    index = GroupIndex(mount_group, mount_id_to_mount_group, metric_fields(metrics))
+
+    with PROFILER.stage("aggregation") as stage:
+        count = 0
+        for count, line in enumerate(rows, 1):
+            index.add(line)
+
+        stage.rows = count
+
+    return build_response(index, bosses, metrics)
+
+
+def load(
+    path: str,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+) -> List[Record]:
+    catalog = MountCatalog(mount_group, mount_id_to_force_id)
+
+    # 同一团队的成员行共享 teammate 字段, 阵容及其派生统计只解析一次
+    teams = {}
+
+    # 保持输入顺序, 依赖击杀先后的统计由 GroupIndex 按 (finish_time, 行号) 排列
+    data = []
+
+    with PROFILER.stage("read_csv") as stage, open(path, "r+", encoding="utf-8") as f:
+        for line in DictReader(f):
+            if line["status"] != "1" or line["verified"] != "1":
+                continue
+
+            key = (line["achieve_id"], line["finish_time"], line["teammate"])
+
+            if (team := teams.get(key)) is None:
+                with PROFILER.stage("roster_parsing") as roster_stage:
+                    team = teams[key] = catalog.compose(line["teammate"])
+                    roster_stage.rows = line["teammate"].count(";") + 1
+
+            data.append(parse_line(line, catalog, team))
+
+        stage.rows = len(data)
+
+    return data
+
+
+def parse_line(line: dict, catalog: MountCatalog, team: Team | None = None) -> Record:
+    """将 CSV 行转换为紧凑的 Record, 区服 / BOSS / 时间等重复的字符串只保留一份"""
+    # 空值记为 None, 避免统计时重复解析字符串
+    return Record(
+        intern(line["achieve_id"]),
+        intern(line["server"]),
+        intern(line["finish_time"]),
+        line["is_leader"],
+        catalog.canonical(int(line["mount"])),
+        *(float(line[stat]) if line[stat] else None for stat in STAT_MOUNT_GROUPS),
+        team,
+    )
+
+
+def stream(
+    path: str,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[List[Record]]:
+    """
+    分批读取 CSV, 每批最多 chunk_size 行, 读完即可交给 GroupIndex 聚合后丢弃.
+    只有团长行需要阵容统计, 因此不缓存阵容, 成员行只保留心法与数值.
+    GroupIndex 仍保存全部数值样本, 只有 sketch 模式下内存与行数无关.
+    """
+    catalog = MountCatalog(mount_group, mount_id_to_force_id)
+
+    with open(path, "r", encoding="utf-8") as f:
+        reader = DictReader(f)
+
+        while True:
+            start = reader.line_num
+
+            with PROFILER.stage("read_csv") as stage:
+                chunk = list(parse_rows(islice(reader, chunk_size), catalog))
+                stage.rows = len(chunk)
+
+            if reader.line_num == start:
+                return
+
+            yield chunk
+
+
+def parse_rows(lines: Iterable[dict], catalog: MountCatalog) -> Iterator[Record]:
+    """过滤并解析 CSV 行, 只为团长行解析阵容"""
+    for line in lines:
+        if line["status"] != "1" or line["verified"] != "1":
+            continue
+
+        team = catalog.compose(line["teammate"]) if line["is_leader"] == "1" else None
+
+        yield parse_line(line, catalog, team)
+
+
+def load_mapping() -> Tuple[dict, dict, dict]:
+    with open(MAPPING_FILES[0], "r+", encoding="utf-8") as f:
+        mount_group = json.load(f)
+
+    with open(MAPPING_FILES[1], "r+", encoding="utf-8") as f:
+        school = json.load(f)
+
+    mount_id_to_force_id = {
+        mount: v["force_id"] for v in school.values() for mount in v["mounts"]
+    }
+
+    mount_id_to_mount_group = {
+        mount_id: k for k, v in mount_group["mount_group"].items() for mount_id in v
+    }
+
+    return mount_group, mount_id_to_force_id, mount_id_to_mount_group
+
+
+def load_data(
+    path: str,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+    cache_dir: str | None = None,
+) -> List[Record]:
+    if cache_dir:
+        from parse_cache import load_cached
+
+        return load_cached(path, cache_dir, mount_group, mount_id_to_force_id)
+
+    return load(path, mount_group, mount_id_to_force_id)
+
+
+def build_index(
+    path: str,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+    mount_id_to_mount_group: dict,
+    *,
+    columnar: bool = False,
+    cache_dir: str | None = None,
+    incremental_output: str | None = None,
+    streaming: bool = False,
+    parse_workers: int = 0,
+    metrics: Iterable[str] | None = None,
+    cube: bool = False,
+    sketch: bool = False,
+) -> GroupIndex:
+    if cube and (columnar or incremental_output):
+        raise ValueError("the cube is not supported in columnar or incremental mode")
+
+    if sketch and columnar:
+        raise ValueError("sketches are not supported in columnar mode")
+
+    if columnar:
+        from columnar import build_columnar_index, load_columnar
+
+        with PROFILER.stage("load_columnar"):
+            data = load_columnar(path)
+
+        with PROFILER.stage("aggregation", len(data.mount)):
+            return build_columnar_index(
+                data, mount_group, mount_id_to_force_id, mount_id_to_mount_group
+            )
+
+    if incremental_output:
+        from incremental import update_index
+
+        return update_index(
+            path,
+            incremental_output,
+            mount_group,
+            mount_id_to_force_id,
+            mount_id_to_mount_group,
+            sketch,
+        )
+
+    fields = metric_fields(resolve_metrics(metrics))
+
+    if cube:
+        fields.add(CUBE_FIELD)
+    if sketch:
+        fields.add(SKETCH_FIELD)
+
+    if parse_workers:
+        from parallel import build_parallel_index
+
+        return build_parallel_index(
+            path,
+            mount_group,
+            mount_id_to_force_id,
+            mount_id_to_mount_group,
+            parse_workers,
+            fields,
+        )
+
+    index = GroupIndex(mount_group, mount_id_to_mount_group, fields)
+
+    if streaming:
+        for chunk in stream(path, mount_group, mount_id_to_force_id):
+            with PROFILER.stage("aggregation", len(chunk)):
+                for line in chunk:
+                    index.add(line)
+
+        return index
+
+    data = load_data(path, mount_group, mount_id_to_force_id, cache_dir)
+
+    with PROFILER.stage("aggregation", len(data)):
+        for line in data:
+            index.add(line)
+
+    return index
+
+
+def dumps(response: dict | list) -> str:
+    return json.dumps(
+        response, ensure_ascii=False, separators=(",", ":"), sort_keys=False
+    )
+
+
+def dump(response: dict, output: str) -> None:
+    with PROFILER.stage("dump"), open(output, "w+", encoding="utf-8") as f:
+        f.write(dumps(response))
@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import List, Tuple
+
+from analysis import build_index, build_response, dump, load_mapping
+
+# 工作进程内共享的映射表, 由 init_worker 在进程启动时设置一次
+_mapping: Tuple[dict, dict, dict] | None = None
+
+
+def load_manifest(path: str) -> List[dict]:
+    """
+    清单为 JSON 数组, 每个活动包含 input / boss / output:
+    [{"input": "event_1.csv", "boss": "8548,8549", "output": "output/event_1.json"}]
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    events = []
+    for event in manifest:
+        boss = event["boss"]
+
+        events.append(
+            {
+                "input": event["input"],
+                "boss": (
+                    boss.split(",") if isinstance(boss, str) else list(map(str, boss))
+                ),
+                "output": event["output"],
+            }
+        )
+
+    return events
+
+
+def init_worker(mapping: Tuple[dict, dict, dict]) -> None:
+    global _mapping
+    _mapping = mapping
+
+
+def run_event(event: dict, cache_dir: str | None = None) -> float:
+    start = perf_counter()
+
+    index = build_index(event["input"], *_mapping, cache_dir=cache_dir)
+
+    dump(build_response(index, event["boss"]), event["output"])
+
+    return perf_counter() - start
+
+
+def run_batch(
+    events: List[dict], workers: int | None = None, cache_dir: str | None = None
+) -> List[dict]:
+    """并发处理多个活动, 单个活动失败不影响其余活动"""
+    mapping = load_mapping()
+
+    report = []
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(mapping,)
+    ) as executor:
+        futures = {
+            executor.submit(run_event, event, cache_dir): event for event in events
+        }
+
+        for future, event in futures.items():
+            if (error := future.exception()) is None:
+                report.append(
+                    {"output": event["output"], "ok": True, "seconds": future.result()}
+                )
+            else:
+                report.append(
+                    {"output": event["output"], "ok": False, "error": repr(error)}
+                )
+
+    return report
+
+
+def main() -> None:
+    parser = ArgumentParser()
+
+    parser.add_argument("-m", "--manifest", type=str, required=True)
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-dir", type=str, default=None)
+
+    args = parser.parse_args()
+
+    start = perf_counter()
+
+    report = run_batch(load_manifest(args.manifest), args.workers, args.cache_dir)
+
+    for item in report:
+        if item["ok"]:
+            print(f"{item['output']}: {item['seconds']:.3f}s")
+        else:
+            print(f"{item['output']}: FAILED {item['error']}", file=sys.stderr)
+
+    failed = sum(not item["ok"] for item in report)
+    print(
+        f"{len(report) - failed}/{len(report)} events in {perf_counter() - start:.3f}s"
+    )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from argparse import SUPPRESS, ArgumentParser
+from csv import DictReader
+from functools import partial
+from time import perf_counter
+from typing import Any, Callable, List
+
+from analysis import (
+    METRICS,
+    GroupIndex,
+    analyze,
+    dump,
+    load,
+    load_mapping,
+)
+from catalog import MountCatalog
+from synthetic import TEAM_SIZE, generate
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def peak_rss_mb() -> float:
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(
+    stages: List[dict], name: str, rows: int | Callable[[Any], int], func: Callable
+):
+    start = perf_counter()
+    result = func()
+    seconds = perf_counter() - start
+
+    if callable(rows):
+        rows = rows(result)
+
+    stages.append(
+        {
+            "stage": name,
+            "seconds": seconds,
+            "rows": rows,
+            "rows_per_second": rows / seconds if rows and seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    )
+
+    return result
+
+
+def run_one(path: str, bosses: List[str]) -> List[dict]:
+    """在独立进程内对单个输入计时, 保证各规模的峰值内存互不影响"""
+    stages = []
+
+    mount_group, mount_id_to_force_id, mount_id_to_mount_group = timed(
+        stages, "mapping", 0, load_mapping
+    )
+
+    def ingest():
+        rosters = set()
+        rows = 0
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in DictReader(f):
+                rows += 1
+                if line["status"] == "1" and line["verified"] == "1":
+                    rosters.add(line["teammate"])
+
+        return rows, rosters
+
+    total, rosters = timed(stages, "ingestion", lambda result: result[0], ingest)
+
+    catalog = MountCatalog(mount_group, mount_id_to_force_id)
+
+    timed(
+        stages,
+        "roster_parsing",
+        len(rosters) * TEAM_SIZE,
+        # map 在创建时绑定 rosters, 之后即可释放; 解析在 list() 调用时发生
+        partial(list, map(catalog.compose, rosters)),
+    )
+    del rosters
+
+    data = timed(
+        stages, "load", total, lambda: load(path, mount_group, mount_id_to_force_id)
+    )
+
+    def aggregate():
+        index = GroupIndex(mount_group, mount_id_to_mount_group)
+        for line in data:
+            index.add(line)
+        return index
+
+    timed(stages, "aggregation", len(data), aggregate)
+
+    # 单个指标的耗时包含其依赖字段的聚合与输出
+    mapping = (mount_group, mount_id_to_force_id, mount_id_to_mount_group)
+
+    response = {}
+    for name in METRICS:
+        response.update(
+            timed(
+                stages,
+                f"metric:{name}",
+                len(data),
+                lambda: analyze(data, bosses, [name], mapping),
+            )
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timed(
+            stages,
+            "dump",
+            0,
+            lambda: dump(response, os.path.join(tmp, "result.json")),
+        )
+
+    return stages
+
+
+def main() -> None:
+    parser = ArgumentParser()
+
+    parser.add_argument("--sizes", type=str, default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--bosses", type=int, default=5)
+    parser.add_argument("--servers", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=str, default=".bench")
+    parser.add_argument("-o", "--output", type=str, default="bench_result.json")
+    parser.add_argument("--run-one", type=str, default=None, help=SUPPRESS)
+
+    args = parser.parse_args()
+
+    boss_lst = [str(10000 + i) for i in range(args.bosses)]
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, boss_lst)))
+        return
+
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    results = []
+
+    for size in map(int, args.sizes.split(",")):
+        teams = max(size // TEAM_SIZE, 1)
+        path = os.path.join(
+            args.work_dir,
+            f"synthetic_{size}_{args.bosses}_{args.servers}_{args.seed}.csv",
+        )
+
+        if not os.path.exists(path):
+            generate(path, teams, args.bosses, args.servers, args.seed)
+
+        process = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--run-one",
+                path,
+                "--bosses",
+                str(args.bosses),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        stages = json.loads(process.stdout)
+
+        results.append({"size": size, "teams": teams, "stages": stages})
+
+        print(f"== {size} rows ({teams} teams)")
+        for stage in stages:
+            throughput = (
+                f"{stage['rows_per_second']:>14,.0f} rows/s"
+                if stage["rows_per_second"]
+                else " " * 21
+            )
+            print(
+                f"{stage['stage']:<40}{stage['seconds']:>10.3f}s"
+                f"{throughput}{stage['peak_rss_mb']:>10.1f} MB"
+            )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+from collections import Counter
+from typing import Dict, List, NamedTuple, Tuple
+
+# 同一心法的多个 ID, 统计时合并到后者 (藏剑)
+MOUNT_ALIASES = {10144: 10145}
+
+
+def lineup_signature(mount_count: Dict[int, int]) -> str:
+    """阵容的规范签名, 按心法 ID 排序的 心法:人数, 与成员顺序无关"""
+    return ",".join(
+        f"{mount_id}:{count}" for mount_id, count in sorted(mount_count.items())
+    )
+
+
+def parse_lineup(lineup: str) -> Counter:
+    """lineup_signature 的逆运算, 也接受逐个成员列出的心法 ID, 如 10002,10002,10021"""
+    mount_count = Counter()
+
+    for item in lineup.split(","):
+        mount_id, _, count = item.partition(":")
+        mount_id = int(mount_id)
+
+        mount_count[MOUNT_ALIASES.get(mount_id, mount_id)] += int(count or 1)
+
+    return mount_count
+
+
+class Member(NamedTuple):
+    """teammate 字段中的单个成员"""
+
+    name: str
+    mount_id: int
+    global_role_id: str
+    role_id: str
+
+
+class Team:
+    """
+    compose 的结果, 同一团队的所有行共享. 支持 team["mount_count"] 下标访问;
+    成员列表只在读取 teammate 时从原始字段解析, 不常驻内存.
+    """
+
+    __slots__ = (
+        "roster",
+        "mount_count",
+        "force_count",
+        "hps_count",
+        "tank_count",
+        "dps_count",
+        "外攻",
+        "内攻",
+    )
+
+    __getitem__ = object.__getattribute__
+
+    def __init__(
+        self,
+        roster: str,
+        mount_count: Counter,
+        force_count: Counter,
+        hps_count: int,
+        tank_count: int,
+        external: int,
+        internal: int,
+    ) -> None:
+        self.roster = roster
+        self.mount_count = mount_count
+        self.force_count = force_count
+        self.hps_count = hps_count
+        self.tank_count = tank_count
+        self.dps_count = external + internal
+        self.外攻 = external
+        self.内攻 = internal
+
+    @property
+    def lineup(self) -> str:
+        return lineup_signature(self.mount_count)
+
+    @property
+    def teammate(self) -> List[Member]:
+        members = []
+
+        for member in self.roster.split(";"):
+            # 缺少的角色字段记为空字符串
+            name, mount_id, global_role_id, role_id = (member.split(",") + ["", ""])[:4]
+
+            mount_id = int(mount_id)
+            mount_id = MOUNT_ALIASES.get(mount_id, mount_id)
+
+            members.append(Member(name, mount_id, global_role_id, role_id))
+
+        return members
+
+
+class MountCatalog:
+    """
+    由映射表编译的心法目录. 心法 ID 经定长查找表映射为稠密下标,
+    门派与心法分组均按下标取值, 一次遍历即可得到团队的阵容组成.
+    """
+
+    def __init__(self, mount_group: dict, mount_id_to_force_id: dict) -> None:
+        self.group_names: List[str] = list(mount_group["mount_group"])
+
+        # 稠密下标 -> 心法 ID / 门派 ID / 所属分组下标
+        self.mount_ids: List[int] = [
+            mount_id
+            for mount_id in mount_id_to_force_id
+            if mount_id not in MOUNT_ALIASES
+        ]
+        self.force_ids: List[int] = [
+            mount_id_to_force_id[mount_id] for mount_id in self.mount_ids
+        ]
+
+        ids = {mount_id: i for i, mount_id in enumerate(self.mount_ids)}
+
+        self.groups_of: List[Tuple[int, ...]] = [()] * len(self.mount_ids)
+        for code, name in enumerate(self.group_names):
+            for mount_id in mount_group["mount_group"][name]:
+                if mount_id in ids:
+                    self.groups_of[ids[mount_id]] += (code,)
+
+        for alias, mount_id in MOUNT_ALIASES.items():
+            if mount_id in ids:
+                ids[alias] = ids[mount_id]
+
+        # 心法 ID -> 稠密下标, -1 表示未知心法
+        self.slot: List[int] = [-1] * (max(ids, default=-1) + 1)
+        for mount_id, i in ids.items():
+            self.slot[mount_id] = i
+
+    def id(self, mount_id: int) -> int:
+        if 0 <= mount_id < len(self.slot) and (i := self.slot[mount_id]) >= 0:
+            return i
+
+        raise KeyError(mount_id)
+
+    def canonical(self, mount_id: int) -> int:
+        if 0 <= mount_id < len(self.slot) and (i := self.slot[mount_id]) >= 0:
+            return self.mount_ids[i]
+
+        return MOUNT_ALIASES.get(mount_id, mount_id)
+
+    def compose(self, roster: str) -> Team:
+        """解析 teammate 字段, 返回心法 / 门派 / 分组 / 内外功计数"""
+        mount_ids, slot = self.mount_ids, self.slot
+
+        # 按稠密下标计数, order 记录首次出现顺序, 与逐个成员累加 Counter 一致
+        counts = [0] * len(mount_ids)
+        order = []
+
+        for member in roster.split(";"):
+            mount_id = int(member.split(",", 2)[1])
+            if not 0 <= mount_id < len(slot) or (i := slot[mount_id]) < 0:
+                raise KeyError(mount_id)
+
+            if not counts[i]:
+                order.append(i)
+            counts[i] += 1
+
+        force_count = Counter()
+        group_count = dict.fromkeys(self.group_names, 0)
+
+        for i in order:
+            force_count[self.force_ids[i]] += counts[i]
+
+            for code in self.groups_of[i]:
+                group_count[self.group_names[code]] += counts[i]
+
+        return Team(
+            roster,
+            Counter({mount_ids[i]: counts[i] for i in order}),
+            force_count,
+            group_count["治疗"],
+            group_count["坦克"],
+            group_count["外攻"],
+            group_count["内攻"],
+        )
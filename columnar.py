@@ -0,0 +1,368 @@
+from array import array
+from collections import Counter
+from csv import reader
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from accumulator import OrderedCounter
+from analysis import STAT_MOUNT_GROUPS, TOP_N, GroupIndex
+from catalog import MOUNT_ALIASES, lineup_signature
+
+# mount 为 int16, 以此作为 (分组, 心法) 联合编码的基数
+MOUNT_KEY_SIZE = 1 << 15
+
+
+class ColumnarData:
+    """按 finish_time 排序后的列式数据, server / achieve_id 为字典编码"""
+
+    def __init__(
+        self,
+        servers: List[str],
+        achieve_ids: List[str],
+        server: "np.ndarray",
+        achieve_id: "np.ndarray",
+        finish_time: "np.ndarray",
+        is_leader: "np.ndarray",
+        mount: "np.ndarray",
+        stat: Dict[str, "np.ndarray"],
+        roster_team: "np.ndarray",
+        roster_mount: "np.ndarray",
+    ) -> None:
+        self.servers = servers
+        self.achieve_ids = achieve_ids
+
+        self.server = server
+        self.achieve_id = achieve_id
+        self.finish_time = finish_time
+        self.is_leader = is_leader
+        self.mount = mount
+        self.stat = stat
+
+        # 团长行的阵容展开, roster_team 为所属团队在团长行中的序号
+        self.roster_team = roster_team
+        self.roster_mount = roster_mount
+
+    @classmethod
+    def empty(cls) -> "ColumnarData":
+        return cls(
+            servers=[],
+            achieve_ids=[],
+            server=np.empty(0, dtype=np.int32),
+            achieve_id=np.empty(0, dtype=np.int32),
+            finish_time=np.empty(0, dtype=np.int64),
+            is_leader=np.empty(0, dtype=np.bool_),
+            mount=np.empty(0, dtype=np.int16),
+            stat={key: np.empty(0, dtype=np.float64) for key in STAT_MOUNT_GROUPS},
+            roster_team=np.empty(0, dtype=np.int64),
+            roster_mount=np.empty(0, dtype=np.int16),
+        )
+
+
+def encode(codes: Dict[str, int], value: str) -> int:
+    code = codes.get(value)
+
+    if code is None:
+        code = codes[value] = len(codes)
+
+    return code
+
+
+def load_columnar(path: str) -> ColumnarData:
+    if np is None:
+        raise RuntimeError("--columnar requires numpy to be installed")
+
+    servers: Dict[str, int] = {}
+    achieve_ids: Dict[str, int] = {}
+    finish_times: Dict[str, int] = {}
+
+    server = array("i")
+    achieve_id = array("i")
+    finish_time = array("i")
+    is_leader = array("b")
+    mount = array("h")
+    stat = {key: array("d") for key in STAT_MOUNT_GROUPS}
+    team = array("i")
+
+    roster_mount = array("h")
+    roster_length = array("i")
+
+    nan = float("nan")
+    alias = MOUNT_ALIASES.get
+
+    with open(path, "r", encoding="utf-8") as f:
+        rows = reader(f)
+
+        # 空文件没有表头, 与逐行读取一样得到空结果
+        if (header := next(rows, None)) is None:
+            return ColumnarData.empty()
+
+        column = {name: i for i, name in enumerate(header)}
+
+        status_col = column["status"]
+        verified_col = column["verified"]
+        server_col = column["server"]
+        achieve_id_col = column["achieve_id"]
+        finish_time_col = column["finish_time"]
+        is_leader_col = column["is_leader"]
+        mount_col = column["mount"]
+        teammate_col = column["teammate"]
+        stat_col = [(stat[key], column[key]) for key in STAT_MOUNT_GROUPS]
+
+        for row in rows:
+            if not row or row[status_col] != "1" or row[verified_col] != "1":
+                continue
+
+            server.append(encode(servers, row[server_col]))
+            achieve_id.append(encode(achieve_ids, row[achieve_id_col]))
+            finish_time.append(encode(finish_times, row[finish_time_col]))
+
+            mount_id = int(row[mount_col])
+            mount.append(alias(mount_id, mount_id))
+
+            for values, col in stat_col:
+                values.append(float(row[col]) if row[col] else nan)
+
+            if row[is_leader_col] == "1":
+                is_leader.append(1)
+                team.append(len(roster_length))
+
+                teammates = row[teammate_col].split(";")
+                for teammate in teammates:
+                    mount_id = int(teammate.split(",")[1])
+                    roster_mount.append(alias(mount_id, mount_id))
+
+                roster_length.append(len(teammates))
+            else:
+                is_leader.append(0)
+                team.append(-1)
+
+    # finish_time 编码为字典序名次, 与按字符串排序的结果一致
+    labels = list(finish_times)
+    finish_time_rank = np.empty(len(labels), dtype=np.int64)
+    finish_time_rank[sorted(range(len(labels)), key=labels.__getitem__)] = np.arange(
+        len(labels), dtype=np.int64
+    )
+
+    finish_time = finish_time_rank[np.array(finish_time, dtype=np.int64)]
+    order = np.argsort(finish_time, kind="stable")
+
+    is_leader = np.array(is_leader, dtype=np.bool_)[order]
+    team = np.array(team, dtype=np.int64)[order][is_leader]
+
+    # 团队序号重排为排序后团长行的顺序, 团队内部保持原阵容顺序
+    team_rank = np.empty(len(roster_length), dtype=np.int64)
+    team_rank[team] = np.arange(len(team), dtype=np.int64)
+
+    roster_team = team_rank[
+        np.repeat(
+            np.arange(len(roster_length), dtype=np.int64),
+            np.array(roster_length, dtype=np.int64),
+        )
+    ]
+    roster_order = np.argsort(roster_team, kind="stable")
+
+    return ColumnarData(
+        servers=list(servers),
+        achieve_ids=list(achieve_ids),
+        server=np.array(server, dtype=np.int32)[order],
+        achieve_id=np.array(achieve_id, dtype=np.int32)[order],
+        finish_time=finish_time[order],
+        is_leader=is_leader,
+        mount=np.array(mount, dtype=np.int16)[order],
+        stat={
+            key: np.array(values, dtype=np.float64)[order]
+            for key, values in stat.items()
+        },
+        roster_team=roster_team[roster_order],
+        roster_mount=np.array(roster_mount, dtype=np.int16)[roster_order],
+    )
+
+
+def lookup_table(mapping: Dict[int, int], size: int) -> "np.ndarray":
+    table = np.full(size, -1, dtype=np.int64)
+
+    for key, value in mapping.items():
+        if 0 <= key < size:
+            table[key] = value
+
+    return table
+
+
+def multiplicity_table(mount_ids: List[int], size: int) -> "np.ndarray":
+    table = np.zeros(size, dtype=np.int64)
+
+    np.add.at(table, [mount_id for mount_id in mount_ids if 0 <= mount_id < size], 1)
+
+    return table
+
+
+def lookup(table: "np.ndarray", keys: "np.ndarray") -> "np.ndarray":
+    values = table[keys]
+
+    if len(values) and (missing := np.flatnonzero(values < 0)).size:
+        raise KeyError(int(keys[missing[0]]))
+
+    return values
+
+
+def count_into(
+    counters: List[OrderedCounter],
+    group: "np.ndarray",
+    key: "np.ndarray",
+    labels: List | None = None,
+) -> None:
+    """按 (分组, 键) 计数, 以首次出现的行号作为排序键, 与逐行累加的顺序一致"""
+    if not len(key):
+        return
+
+    size = int(key.max()) + 1
+
+    uniq, first, counts = np.unique(
+        group.astype(np.int64) * size + key.astype(np.int64),
+        return_index=True,
+        return_counts=True,
+    )
+
+    for i in range(len(uniq)):
+        group_code, key_code = divmod(int(uniq[i]), size)
+
+        counters[group_code].add(
+            labels[key_code] if labels is not None else key_code,
+            int(counts[i]),
+            int(first[i]),
+        )
+
+
+def build_columnar_index(
+    data: ColumnarData,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+    mount_id_to_mount_group: dict,
+) -> GroupIndex:
+    index = GroupIndex(mount_group, mount_id_to_mount_group)
+
+    groups = [index.new_group() for _ in data.achieve_ids]
+    index.groups.update(zip(data.achieve_ids, groups))
+
+    def count_all(attr: str, group: "np.ndarray", key: "np.ndarray", labels=None):
+        count_into([getattr(g, attr) for g in groups], group, key, labels)
+        count_into([getattr(index.all, attr)], np.zeros_like(group), key, labels)
+
+    leader = np.flatnonzero(data.is_leader)
+    leader_boss = data.achieve_id[leader].astype(np.int64)
+    leader_server = data.server[leader].astype(np.int64)
+    leader_mount = data.mount[leader].astype(np.int64)
+
+    ###########
+    # 前 N 击杀 #
+    ###########
+    for position, code in enumerate(leader_server[:TOP_N].tolist()):
+        index.all.leader_server.add(position, data.servers[code])
+    for boss_code, group in enumerate(groups):
+        for position, code in enumerate(
+            leader_server[leader_boss == boss_code][:TOP_N].tolist()
+        ):
+            group.leader_server.add(position, data.servers[code])
+
+    count_all("server_count", leader_boss, leader_server, data.servers)
+
+    ############
+    # 阵容统计 #
+    ############
+    roster_boss = leader_boss[data.roster_team]
+    roster_mount = data.roster_mount.astype(np.int64)
+
+    count_all("mount_count", roster_boss, roster_mount)
+    count_all(
+        "force_count",
+        roster_boss,
+        lookup(lookup_table(mount_id_to_force_id, MOUNT_KEY_SIZE), roster_mount),
+    )
+
+    def team_sum(*names: str) -> "np.ndarray":
+        table = multiplicity_table(
+            [
+                mount_id
+                for name in names
+                for mount_id in mount_group["mount_group"][name]
+            ],
+            MOUNT_KEY_SIZE,
+        )
+        return np.bincount(
+            data.roster_team, weights=table[roster_mount], minlength=len(leader)
+        ).astype(np.int64)
+
+    count_all("hps_count", leader_boss, team_sum("治疗"))
+    count_all("tank_count", leader_boss, team_sum("坦克"))
+
+    for name in ("外攻", "内攻"):
+        team_count = team_sum(name)
+
+        index.all.mount_type_count[name] = int(team_count.sum())
+        for group, value in zip(
+            groups,
+            np.bincount(
+                leader_boss, weights=team_count, minlength=len(groups)
+            ).tolist(),
+        ):
+            group.mount_type_count[name] = int(value)
+
+    group_names = list(mount_group["mount_group"])
+    count_all(
+        "leader_mount_group",
+        leader_boss,
+        lookup(
+            lookup_table(
+                {
+                    mount_id: group_names.index(name)
+                    for mount_id, name in mount_id_to_mount_group.items()
+                },
+                MOUNT_KEY_SIZE,
+            ),
+            leader_mount,
+        ),
+        group_names,
+    )
+
+    ############
+    # 阵容组合 #
+    ############
+    # 阵容展开按团队排序, 各团队的成员是连续的一段
+    bounds = np.searchsorted(data.roster_team, np.arange(len(leader) + 1)).tolist()
+    members = data.roster_mount.tolist()
+
+    lineups: Dict[str, int] = {}
+    lineup_codes = [
+        encode(lineups, lineup_signature(Counter(members[start:end])))
+        for start, end in zip(bounds, bounds[1:])
+    ]
+
+    count_all("lineup_count", leader_boss, np.array(lineup_codes), list(lineups))
+
+    ############
+    # 平均数据 #
+    ############
+    for stat, mounts in index.stat_mounts.items():
+        values = data.stat[stat]
+        mask = ~np.isnan(values) & np.isin(data.mount, list(mounts))
+
+        boss = data.achieve_id[mask].astype(np.int64)
+        mount = data.mount[mask].astype(np.int64)
+        values = values[mask]
+
+        for targets, group in ((groups, boss), ([index.all], boss * 0)):
+            combined = group * MOUNT_KEY_SIZE + mount
+            order = np.argsort(combined, kind="stable")
+
+            uniq, start = np.unique(combined[order], return_index=True)
+
+            for code, chunk in zip(uniq.tolist(), np.split(values[order], start[1:])):
+                group_code, mount_id = divmod(code, MOUNT_KEY_SIZE)
+
+                targets[group_code].stat[stat][mount_id] = chunk.tolist()
+
+    return index
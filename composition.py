@@ -0,0 +1,175 @@
+import heapq
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from analysis import build_index, dump, load_mapping
+from catalog import lineup_signature, parse_lineup
+
+Vector = Tuple[Dict[int, int], Dict[str, int]]
+
+# 倒排索引的词项: (心法 ID, 该心法的第几名成员)
+Token = Tuple[int, int]
+
+
+def l1(a: Dict, b: Dict) -> int:
+    return sum(abs(a.get(key, 0) - b.get(key, 0)) for key in a.keys() | b.keys())
+
+
+def tokens(mount_count: Dict[int, int]) -> List[Token]:
+    return [
+        (mount_id, rank)
+        for mount_id, count in mount_count.items()
+        for rank in range(1, count + 1)
+    ]
+
+
+class LineupIndex:
+    """
+    以阵容签名去重的相似阵容索引. 距离为心法人数差与心法分组 (治疗 / 坦克 / 外攻 / 内攻)
+    人数差之和: 同分组内换一个心法距离为 2, 跨分组为 4.
+
+    每个阵容拆分为 (心法, 第几名) 词项建立倒排索引, 两个阵容的共同成员数即共同词项数.
+    查询按出现次数从少到多处理词项, 处理完前 p 个词项后, 未出现过的阵容与查询至多共有
+    n - p 名成员, 距离不小于 p; 当前第 k 近的距离小于 p 时即可停止, 结果与逐一比较一致.
+    """
+
+    def __init__(self, mount_id_to_mount_group: dict) -> None:
+        self.mount_id_to_mount_group = mount_id_to_mount_group
+
+        self.lineups: List[str] = []
+        self.vectors: List[Vector] = []
+        self.counts: List[int] = []
+        self.ids: Dict[str, int] = {}
+
+        self.postings: Dict[Token, List[int]] = defaultdict(list)
+
+    @classmethod
+    def build(
+        cls, lineups: Iterable[Tuple[str, int]], mount_id_to_mount_group: dict
+    ) -> "LineupIndex":
+        """由 (阵容签名, 团队数) 构建, 如 BossGroup.lineup_count.items()"""
+        index = cls(mount_id_to_mount_group)
+
+        for lineup, count in lineups:
+            index.add(lineup, count)
+
+        return index
+
+    def __len__(self) -> int:
+        return len(self.lineups)
+
+    def vector(self, mount_count: Dict[int, int]) -> Vector:
+        groups = Counter()
+
+        for mount_id, count in mount_count.items():
+            groups[self.mount_id_to_mount_group.get(mount_id)] += count
+
+        return dict(mount_count), groups
+
+    @staticmethod
+    def distance(a: Vector, b: Vector) -> int:
+        return l1(a[0], b[0]) + l1(a[1], b[1])
+
+    def add(self, lineup: str, count: int = 1) -> None:
+        if (i := self.ids.get(lineup)) is not None:
+            self.counts[i] += count
+            return
+
+        mount_count = parse_lineup(lineup)
+
+        i = self.ids[lineup] = len(self.lineups)
+        self.lineups.append(lineup)
+        self.vectors.append(self.vector(mount_count))
+        self.counts.append(count)
+
+        for token in tokens(mount_count):
+            self.postings[token].append(i)
+
+    def nearest(self, lineup: str, k: int = 10) -> List[Tuple[str, int, int]]:
+        """
+        返回与 lineup 最接近的 k 个阵容 (签名, 距离, 团队数), 按距离升序,
+        同距离时团队数多的在前. lineup 为签名或逐个成员列出的心法 ID.
+        """
+        if k <= 0:
+            return []
+
+        mount_count = parse_lineup(lineup)
+        target = self.vector(mount_count)
+
+        # 最小堆的堆顶为当前第 k 近的阵容: 距离最大, 其次团队数最少, 其次最晚加入
+        best: List[Tuple[int, int, int]] = []
+        seen = set()
+
+        def visit(candidates: Iterable[int]) -> None:
+            for i in candidates:
+                if i in seen:
+                    continue
+                seen.add(i)
+
+                item = (-self.distance(self.vectors[i], target), self.counts[i], -i)
+
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+
+        query = sorted(
+            tokens(mount_count), key=lambda token: len(self.postings.get(token, ()))
+        )
+
+        for p, token in enumerate(query):
+            if len(best) == k and -best[0][0] < p:
+                break
+
+            visit(self.postings.get(token, ()))
+        else:
+            # 与查询没有共同成员的阵容距离不小于 n, 仍可能进入前 k 个
+            if len(best) < k or -best[0][0] >= len(query):
+                visit(range(len(self.lineups)))
+
+        result = sorted((-distance, -count, -i) for distance, count, i in best)
+
+        return [(self.lineups[i], distance, -count) for distance, count, i in result]
+
+
+def main() -> None:
+    parser = ArgumentParser()
+
+    parser.add_argument("-i", "--input", type=str, required=True)
+    parser.add_argument("-o", "--output", type=str, default="similar.json")
+    parser.add_argument("--boss", type=str, default=None)
+    parser.add_argument("--lineup", type=str, required=True)
+    parser.add_argument("-k", type=int, default=10)
+
+    args = parser.parse_args()
+
+    mount_group, mount_id_to_force_id, mount_id_to_mount_group = load_mapping()
+
+    index = build_index(
+        args.input,
+        mount_group,
+        mount_id_to_force_id,
+        mount_id_to_mount_group,
+        streaming=True,
+        metrics=["lineup_count"],
+    )
+
+    group = index.group(args.boss) if args.boss else index.all
+
+    lineups = LineupIndex.build(group.lineup_count.items(), mount_id_to_mount_group)
+
+    similar = lineups.nearest(lineup_signature(parse_lineup(args.lineup)), args.k)
+
+    dump(
+        {
+            "item": [lineup for lineup, _, _ in similar],
+            "value": [count for _, _, count in similar],
+            "distance": [distance for _, distance, _ in similar],
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import csv
+import json
+
+import pytest
+
+from analysis import load_mapping
+
+MOUNT_GROUP = {
+    "mount_group": {
+        "治疗": [10028],
+        "坦克": [10062],
+        "外攻": [10026],
+        "内攻": [10003],
+    }
+}
+
+SCHOOL = {
+    "s1": {"force_id": 1, "mounts": [10028, 10062]},
+    "s2": {"force_id": 2, "mounts": [10026, 10003]},
+}
+
+FIELDNAMES = (
+    "team_id,server,achieve_id,finish_time,status,verified,is_leader,"
+    "mount,dps,hps,damage,therapy,teammate"
+).split(",")
+
+ROSTERS = [
+    [10062, 10028, 10026, 10026, 10003],
+    [10062, 10028, 10026, 10026, 10003],
+    [10062, 10028, 10028, 10003, 10003],
+]
+
+
+def event_row(team_id: int, roster: list) -> dict:
+    return {
+        "team_id": team_id,
+        "server": "梦江南",
+        "achieve_id": "8548",
+        "finish_time": 1680000000 + team_id,
+        "status": 1,
+        "verified": 1,
+        "is_leader": 1,
+        "mount": roster[0],
+        "dps": 100000 + team_id * 1000,
+        "hps": 1000,
+        "damage": 1000000,
+        "therapy": 10000,
+        "teammate": ";".join(
+            f"p{team_id}_{i},{mount_id},{team_id * 10 + i},{i}"
+            for i, mount_id in enumerate(roster)
+        ),
+    }
+
+
+def write_event(path, rosters: list = ROSTERS, start: int = 0) -> None:
+    """写入以 start 为起始团队 ID 的团长记录, start 不为 0 时追加到文件末尾"""
+    with open(path, "w" if start == 0 else "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, FIELDNAMES)
+        if start == 0:
+            writer.writeheader()
+
+        for team_id, roster in enumerate(rosters, start):
+            writer.writerow(event_row(team_id, roster))
+
+
+@pytest.fixture
+def mapping(tmp_path, monkeypatch):
+    """在临时目录写入最小的映射文件, 返回 load_mapping 的结果"""
+    monkeypatch.chdir(tmp_path)
+
+    (tmp_path / "mount_group.json").write_text(json.dumps(MOUNT_GROUP), "utf-8")
+    (tmp_path / "school.json").write_text(json.dumps(SCHOOL), "utf-8")
+
+    return load_mapping()
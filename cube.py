@@ -0,0 +1,209 @@
+import gzip
+import json
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from sketch import QuantileSketch
+
+# 立方体的维度, 与 CSV 列名一致
+DIMENSIONS = ("achieve_id", "server", "mount")
+
+Key = Tuple[str, str, int]
+
+
+class Cell:
+    """
+    单个 (achieve_id, server, mount) 的聚合值:
+    attendance 为该区服团队阵容中该心法的出场次数, teams 为该心法担任团长的团队数,
+    stat 为各项数值的可合并分位数草图, total 为各项数值的总和.
+    上卷后计数与总和精确, IQR 过滤后的平均值由草图估计.
+    """
+
+    __slots__ = ("attendance", "teams", "stat", "total")
+
+    def __init__(self, stats: Iterable[str]) -> None:
+        self.attendance = 0
+        self.teams = 0
+        self.stat: Dict[str, QuantileSketch] = {
+            stat: QuantileSketch() for stat in stats
+        }
+        self.total: Dict[str, float] = dict.fromkeys(self.stat, 0.0)
+
+    def merge(self, other: "Cell") -> None:
+        self.attendance += other.attendance
+        self.teams += other.teams
+
+        for stat, sketch in other.stat.items():
+            self.stat[stat].merge(sketch)
+            self.total[stat] += other.total[stat]
+
+    def value(self, measure: str) -> int | float | None:
+        """
+        measure 为 attendance / teams, 数值名 (如 dps, 即 IQR 过滤后平均值的草图估计),
+        或 <数值名>_count / <数值名>_sum
+        """
+        if measure in ("attendance", "teams"):
+            return getattr(self, measure)
+
+        stat, _, aggregate = measure.rpartition("_")
+
+        if aggregate == "count" and stat in self.stat:
+            return len(self.stat[stat])
+        if aggregate == "sum" and stat in self.stat:
+            return self.total[stat]
+
+        sketch = self.stat[measure]
+
+        return sketch.iqr_mean() if len(sketch) else None
+
+
+class Cube:
+    """按 (achieve_id, server, mount) 预聚合的立方体, 切片与上卷均不需要原始数据"""
+
+    def __init__(self, stats: Sequence[str]) -> None:
+        self.stats = tuple(stats)
+        self.cells: Dict[Key, Cell] = {}
+
+    def cell(self, key: Key) -> Cell:
+        if (cell := self.cells.get(key)) is None:
+            cell = self.cells[key] = Cell(self.stats)
+
+        return cell
+
+    def add(self, line: dict) -> None:
+        boss, server = line["achieve_id"], line["server"]
+
+        if line["is_leader"] == "1":
+            self.cell((boss, server, line["mount"])).teams += 1
+
+            for mount_id, count in line["mount_count"].items():
+                self.cell((boss, server, mount_id)).attendance += count
+
+        cell = None
+
+        for stat in self.stats:
+            if (value := line[stat]) is not None:
+                if cell is None:
+                    cell = self.cell((boss, server, line["mount"]))
+
+                cell.stat[stat].append(value)
+                cell.total[stat] += value
+
+    def merge(self, other: "Cube") -> None:
+        for key, cell in other.cells.items():
+            self.cell(key).merge(cell)
+
+    def slice(self, **where: Any) -> Iterator[Tuple[Key, Cell]]:
+        """
+        按维度筛选单元格, 取值可以是单个值或值的集合, 例如
+        cube.slice(achieve_id="8548", server={"梦江南", "唯我独尊"})
+        """
+        filters = []
+
+        for dimension, value in where.items():
+            if dimension not in DIMENSIONS:
+                raise KeyError(dimension)
+
+            if not isinstance(value, (set, frozenset, list, tuple)):
+                value = (value,)
+
+            filters.append((DIMENSIONS.index(dimension), set(value)))
+
+        for key, cell in self.cells.items():
+            if all(key[i] in values for i, values in filters):
+                yield key, cell
+
+    def rollup(self, by: Sequence[str] = (), **where: Any) -> Dict[tuple, Cell]:
+        """按 by 中的维度分组上卷筛选后的单元格, by 为空时合并为一个单元格"""
+        positions = [DIMENSIONS.index(dimension) for dimension in by]
+
+        result: Dict[tuple, Cell] = {}
+
+        for key, cell in self.slice(**where):
+            group = tuple(key[i] for i in positions)
+
+            if (target := result.get(group)) is None:
+                target = result[group] = Cell(self.stats)
+
+            target.merge(cell)
+
+        return result
+
+    def query(self, measure: str, by: str | Sequence[str], **where: Any) -> dict:
+        """返回与统计结果相同的 {"item": [...], "value": [...]} 结构, 按值降序"""
+        if isinstance(by, str):
+            by = (by,)
+
+        items = sorted(
+            (
+                (group[0] if len(group) == 1 else list(group), value)
+                for group, cell in self.rollup(by, **where).items()
+                if (value := cell.value(measure)) is not None
+            ),
+            key=itemgetter(1),
+            reverse=True,
+        )
+
+        return {
+            "item": [item for item, _ in items],
+            "value": [value for _, value in items],
+        }
+
+    def dump(self, path: str) -> None:
+        """
+        以 gzip 压缩的 JSON 保存, 维度值编码为字典下标, 每个单元格为
+        [BOSS 下标, 区服下标, 心法下标, attendance, teams, 各项数值的 [总和, 草图]...].
+        每个草图至多保存约 3 * k 个样本, 文件大小只随单元格数增长, 与输入行数无关
+        """
+        tables: Dict[str, Dict[Any, int]] = {dimension: {} for dimension in DIMENSIONS}
+
+        cells: List[list] = []
+
+        for key, cell in self.cells.items():
+            codes = [
+                tables[dimension].setdefault(value, len(tables[dimension]))
+                for dimension, value in zip(DIMENSIONS, key)
+            ]
+
+            cells.append(
+                codes
+                + [cell.attendance, cell.teams]
+                + [
+                    [cell.total[stat], cell.stat[stat].to_list()]
+                    for stat in self.stats
+                ]
+            )
+
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dimensions": {
+                        dimension: list(table) for dimension, table in tables.items()
+                    },
+                    "stats": self.stats,
+                    "cells": cells,
+                },
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "Cube":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+
+        cube = cls(data["stats"])
+        tables = [data["dimensions"][dimension] for dimension in DIMENSIONS]
+
+        for row in data["cells"]:
+            key = tuple(table[code] for table, code in zip(tables, row[:3]))
+
+            cell = cube.cell(key)
+            cell.attendance, cell.teams = row[3], row[4]
+
+            for stat, (total, sketch) in zip(cube.stats, row[5:]):
+                cell.total[stat] = total
+                cell.stat[stat] = QuantileSketch.from_list(sketch)
+
+        return cube
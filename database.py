@@ -0,0 +1,472 @@
+import os
+import sqlite3
+from collections import Counter
+from csv import DictReader
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from analysis import (
+    CHUNK_SIZE,
+    PERCENTILE_METRICS,
+    STAT_MOUNT_GROUPS,
+    TOP_N,
+    parse_rows,
+    rank,
+    resolve_metrics,
+)
+from catalog import MountCatalog
+from inputs import open_input
+from parse_cache import cache_key
+from profiler import PROFILER
+from robust import iqr_mean, percentiles
+
+# 表结构变化时递增, 旧数据库的表会被删除后重建
+VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS source (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS record (
+    source INTEGER NOT NULL REFERENCES source (id),
+    line INTEGER NOT NULL,
+    achieve_id TEXT NOT NULL,
+    server TEXT NOT NULL,
+    finish_time TEXT NOT NULL,
+    is_leader INTEGER NOT NULL,
+    mount INTEGER NOT NULL,
+    dps REAL,
+    damage REAL,
+    hps REAL,
+    therapy REAL,
+    hps_count INTEGER,
+    tank_count INTEGER,
+    external INTEGER,
+    internal INTEGER,
+    lineup TEXT,
+    PRIMARY KEY (source, line)
+);
+CREATE TABLE IF NOT EXISTS teammate (
+    source INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    name TEXT,
+    mount INTEGER NOT NULL,
+    global_role_id TEXT,
+    role_id TEXT,
+    PRIMARY KEY (source, line, slot)
+);
+CREATE INDEX IF NOT EXISTS record_achieve_id ON record (achieve_id);
+CREATE INDEX IF NOT EXISTS record_server ON record (server);
+CREATE INDEX IF NOT EXISTS record_mount ON record (mount);
+CREATE INDEX IF NOT EXISTS record_finish_time ON record (finish_time);
+CREATE INDEX IF NOT EXISTS teammate_mount ON teammate (mount);
+"""
+
+TABLES = ("teammate", "record", "source")
+
+# 团长行的阵容统计, 依次对应 hps_count / tank_count / external / internal / lineup 列
+LEADER_COLUMNS = ("hps_count", "tank_count", "外攻", "内攻", "lineup")
+
+# 与 GroupIndex 的 (finish_time, 分片序号, 行号) 排序一致, 分片序号为本次输入的参数顺序,
+# 而非文件首次载入数据库的先后
+ORDER = "r.finish_time, s.position, r.line"
+
+SELECTED = "JOIN selected AS s ON s.source = r.source"
+
+# 团长行的计数按键分组, 同数量时按各键最早出现的先后排列
+RANK_SQL = """
+SELECT item, COUNT(*) AS value FROM (
+    SELECT {item} AS item, ROW_NUMBER() OVER (ORDER BY {order}) AS seq
+    FROM record AS r {join} {selected}
+    WHERE r.is_leader = 1 AND {where}
+)
+GROUP BY item
+ORDER BY value DESC, MIN(seq)
+"""
+
+Where = Tuple[str, tuple]
+
+SQL_METRICS: Dict[str, Callable[["Database", Where, str], dict]] = {}
+
+
+def sql_metric(*names: str):
+    """同一函数可计算多个指标, 调用时传入指标名"""
+
+    def register(func):
+        for name in names:
+            SQL_METRICS[name] = func
+        return func
+
+    return register
+
+
+class Database:
+    """
+    将过滤后的 CSV 行载入本地 SQLite, 阵容拆分为 teammate 表, 计数指标以 SQL 聚合计算.
+    同一输入文件按内容摘要去重, 重复载入不会重复写入, 内容变化时替换该文件的全部行.
+    """
+
+    def __init__(
+        self, path: str, mount_group: dict, mount_id_to_force_id: dict
+    ) -> None:
+        self.mount_group = mount_group
+        self.mount_id_to_force_id = mount_id_to_force_id
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != VERSION:
+            with self.connection:
+                for table in TABLES:
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {VERSION}")
+
+        self.create_mount_table()
+
+        # 本次统计的输入文件, 数据库中的其他文件不参与计算
+        self.connection.execute(
+            "CREATE TEMP TABLE selected "
+            "(source INTEGER PRIMARY KEY, position INTEGER NOT NULL)"
+        )
+
+    def create_mount_table(self) -> None:
+        """心法维度表随映射表每次重建, 映射表变化无需重新载入数据"""
+        mount_id_to_mount_group = {
+            mount_id: name
+            for name, mount_ids in self.mount_group["mount_group"].items()
+            for mount_id in mount_ids
+        }
+
+        self.connection.execute(
+            "CREATE TEMP TABLE mount ("
+            "mount_id INTEGER PRIMARY KEY, force_id INTEGER, mount_group TEXT)"
+        )
+        self.connection.executemany(
+            "INSERT INTO mount VALUES (?, ?, ?)",
+            [
+                (
+                    mount_id,
+                    self.mount_id_to_force_id.get(mount_id),
+                    mount_id_to_mount_group.get(mount_id),
+                )
+                for mount_id in self.mount_id_to_force_id.keys()
+                | mount_id_to_mount_group.keys()
+            ],
+        )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def load(self, paths: Iterable[str]) -> None:
+        """按参数顺序载入并选中各输入文件, 未变化的文件直接跳过"""
+        catalog = MountCatalog(self.mount_group, self.mount_id_to_force_id)
+
+        with self.connection:
+            self.connection.execute("DELETE FROM selected")
+
+        for position, path in enumerate(paths):
+            source = self.load_source(path, catalog)
+
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO selected VALUES (?, ?)", (source, position)
+                )
+
+    def load_source(self, path: str, catalog: MountCatalog) -> int:
+        path = os.path.abspath(path)
+        digest = cache_key(path)
+
+        row = self.connection.execute(
+            "SELECT id, digest FROM source WHERE path = ?", (path,)
+        ).fetchone()
+
+        if row is not None and row[1] == digest:
+            return row[0]
+
+        with PROFILER.stage("load_database") as stage, self.connection:
+            if row is None:
+                source = self.connection.execute(
+                    "INSERT INTO source (path, digest) VALUES (?, ?)", (path, digest)
+                ).lastrowid
+            else:
+                source = row[0]
+
+                self.connection.execute(
+                    "UPDATE source SET digest = ? WHERE id = ?", (digest, source)
+                )
+                for table in ("record", "teammate"):
+                    self.connection.execute(
+                        f"DELETE FROM {table} WHERE source = ?", (source,)
+                    )
+
+            with open_input(path) as f:
+                reader = DictReader(f)
+                lines = parse_rows(reader, catalog)
+
+                while chunk := self.insert_chunk(source, reader, lines):
+                    stage.rows += chunk
+
+        return source
+
+    def insert_chunk(self, source: int, reader: DictReader, lines: Iterable) -> int:
+        records = []
+        teammates = []
+
+        # parse_rows 逐行产出, reader.line_num 即当前行在文件中的行号
+        for line in islice(lines, CHUNK_SIZE):
+            leader = line["is_leader"] == "1"
+
+            records.append(
+                (
+                    source,
+                    reader.line_num,
+                    line["achieve_id"],
+                    line["server"],
+                    line["finish_time"],
+                    leader,
+                    line["mount"],
+                    *(line[stat] for stat in STAT_MOUNT_GROUPS),
+                    *(
+                        (line[field] for field in LEADER_COLUMNS)
+                        if leader
+                        else (None,) * len(LEADER_COLUMNS)
+                    ),
+                )
+            )
+
+            if leader:
+                teammates.extend(
+                    (
+                        source,
+                        reader.line_num,
+                        slot,
+                        *member,
+                    )
+                    for slot, member in enumerate(line["teammate"])
+                )
+
+        self.connection.executemany(
+            f"INSERT INTO record VALUES ({', '.join('?' * 16)})", records
+        )
+        self.connection.executemany(
+            "INSERT INTO teammate VALUES (?, ?, ?, ?, ?, ?, ?)", teammates
+        )
+
+        return len(records)
+
+    def where(self, boss: str | None) -> Where:
+        where = "r.source IN (SELECT source FROM selected)"
+
+        if boss is None:
+            return where, ()
+
+        return f"{where} AND r.achieve_id = ?", (boss,)
+
+    def rank_leaders(
+        self, item: str, where: Where, join: str = "", order: str = ORDER
+    ) -> dict:
+        items, values = [], []
+
+        sql = RANK_SQL.format(
+            item=item, join=join, selected=SELECTED, where=where[0], order=order
+        )
+
+        for key, value in self.connection.execute(sql, where[1]):
+            items.append(key)
+            values.append(value)
+
+        return {"item": items, "value": values}
+
+    def mount_counts(self, where: Where) -> Dict[int, int]:
+        return dict(
+            self.connection.execute(
+                "SELECT t.mount, COUNT(*) FROM record AS r "
+                "JOIN teammate AS t USING (source, line) "
+                f"WHERE r.is_leader = 1 AND {where[0]} GROUP BY t.mount",
+                where[1],
+            ).fetchall()
+        )
+
+    def samples(self, stat: str, mount_ids: List[int], where: Where) -> Dict[int, list]:
+        """各心法的数值样本, 按心法与数值排序读出"""
+        samples: Dict[int, list] = {}
+
+        sql = (
+            f"SELECT r.mount, r.{stat} FROM record AS r "
+            f"WHERE r.{stat} IS NOT NULL AND {where[0]} "
+            f"AND r.mount IN ({', '.join('?' * len(mount_ids))}) "
+            f"ORDER BY r.mount, r.{stat}"
+        )
+
+        params = where[1] + tuple(mount_ids)
+
+        for mount_id, value in self.connection.execute(sql, params):
+            samples.setdefault(mount_id, []).append(value)
+
+        return samples
+
+    def stat_mounts(self, stat: str) -> List[int]:
+        return [
+            mount_id
+            for name in STAT_MOUNT_GROUPS[stat]
+            for mount_id in self.mount_group["mount_group"][name]
+        ]
+
+    def response(
+        self, boss_lst: List[str], metrics: Iterable[str] | None = None
+    ) -> dict:
+        """与 build_response 的输出结构及内容一致"""
+        response = {}
+
+        for name in resolve_metrics(metrics):
+            func = SQL_METRICS[name]
+
+            with PROFILER.stage(f"metric:{name}"):
+                response[name] = {"all": func(self, self.where(None), name)}
+
+                for boss in boss_lst:
+                    response[name][boss] = func(self, self.where(boss), name)
+
+        return response
+
+
+def select_mount(counts: Dict[int, int], mount_ids: List[int]) -> dict:
+    return rank(Counter({mount_id: counts.get(mount_id, 0) for mount_id in mount_ids}))
+
+
+@sql_metric("top10_achieve_team_count", "top100_achieve_team_count")
+def top_achieve_team_count(db: Database, where: Where, name: str) -> dict:
+    limit = 10 if name == "top10_achieve_team_count" else TOP_N
+
+    items, values = [], []
+
+    for key, value in db.connection.execute(
+        "SELECT server, COUNT(*) AS value FROM ("
+        f"SELECT r.server, ROW_NUMBER() OVER (ORDER BY {ORDER}) AS seq "
+        f"FROM record AS r {SELECTED} WHERE r.is_leader = 1 AND {where[0]} "
+        f"ORDER BY {ORDER} LIMIT ?"
+        ") GROUP BY server ORDER BY value DESC, MIN(seq)",
+        where[1] + (limit,),
+    ):
+        items.append(key)
+        values.append(value)
+
+    return {"item": items, "value": values}
+
+
+@sql_metric("server_rank_team_count")
+def server_rank_team_count(db: Database, where: Where, name: str) -> dict:
+    return db.rank_leaders("r.server", where)
+
+
+@sql_metric("force_attendance_count")
+def force_attendance_count(db: Database, where: Where, name: str) -> dict:
+    # 团队内按成员顺序, 门派的先后即其首个成员的位置
+    return db.rank_leaders(
+        "m.force_id",
+        where,
+        "JOIN teammate AS t USING (source, line) "
+        "JOIN mount AS m ON m.mount_id = t.mount",
+        f"{ORDER}, t.slot",
+    )
+
+
+@sql_metric("mount_attendance_count")
+def mount_attendance_count(db: Database, where: Where, name: str) -> dict:
+    return db.rank_leaders(
+        "t.mount", where, "JOIN teammate AS t USING (source, line)", f"{ORDER}, t.slot"
+    )
+
+
+@sql_metric("hps_count")
+def hps_count(db: Database, where: Where, name: str) -> dict:
+    return db.rank_leaders("r.hps_count", where)
+
+
+@sql_metric("hps_attendance_count")
+def hps_attendance_count(db: Database, where: Where, name: str) -> dict:
+    return select_mount(db.mount_counts(where), db.mount_group["mount_group"]["治疗"])
+
+
+@sql_metric("tank_count")
+def tank_count(db: Database, where: Where, name: str) -> dict:
+    return db.rank_leaders("r.tank_count", where)
+
+
+@sql_metric("tank_attendance_count")
+def tank_attendance_count(db: Database, where: Where, name: str) -> dict:
+    return select_mount(db.mount_counts(where), db.mount_group["mount_group"]["坦克"])
+
+
+@sql_metric("dps_count")
+def dps_count(db: Database, where: Where, name: str) -> dict:
+    return select_mount(db.mount_counts(where), db.stat_mounts("dps"))
+
+
+@sql_metric("mount_type_attendance_count")
+def mount_type_attendance_count(db: Database, where: Where, name: str) -> dict:
+    external, internal = db.connection.execute(
+        "SELECT COALESCE(SUM(r.external), 0), COALESCE(SUM(r.internal), 0) "
+        f"FROM record AS r WHERE r.is_leader = 1 AND {where[0]}",
+        where[1],
+    ).fetchone()
+
+    return rank(Counter({"外攻": external, "内攻": internal}))
+
+
+@sql_metric("lineup_count")
+def lineup_count(db: Database, where: Where, name: str) -> dict:
+    ranked = db.rank_leaders("r.lineup", where)
+
+    return {key: values[:TOP_N] for key, values in ranked.items()}
+
+
+@sql_metric("leader_mount_type_count")
+def leader_mount_type_count(db: Database, where: Where, name: str) -> dict:
+    return db.rank_leaders(
+        "m.mount_group", where, "LEFT JOIN mount AS m ON m.mount_id = r.mount"
+    )
+
+
+# IQR 过滤后的平均值与分位数需要全部样本, 由 SQL 按序读出后计算
+@sql_metric(*(f"rank_mount_{stat}" for stat in STAT_MOUNT_GROUPS))
+def rank_mount_stat(db: Database, where: Where, name: str) -> dict:
+    stat = name.removeprefix("rank_mount_")
+    mount_ids = db.stat_mounts(stat)
+
+    samples = db.samples(stat, mount_ids, where)
+
+    return rank(
+        Counter(
+            {
+                mount_id: iqr_mean(samples[mount_id])
+                for mount_id in mount_ids
+                if mount_id in samples
+            }
+        )
+    )
+
+
+@sql_metric(*PERCENTILE_METRICS)
+def rank_mount_percentile(db: Database, where: Where, name: str) -> dict:
+    stat, _, percentile = name.removeprefix("rank_mount_").rpartition("_p")
+    mount_ids = db.stat_mounts(stat)
+
+    samples = db.samples(stat, mount_ids, where)
+
+    return rank(
+        Counter(
+            {
+                mount_id: percentiles(samples[mount_id], (int(percentile),))[0]
+                for mount_id in mount_ids
+                if mount_id in samples
+            }
+        )
+    )
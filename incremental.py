@@ -0,0 +1,207 @@
+import io
+import mmap
+import os
+import pickle
+from csv import DictReader, Error, reader
+from hashlib import blake2b
+
+from analysis import (
+    FIELDS,
+    MAPPING_FILES,
+    SKETCH_FIELD,
+    GroupIndex,
+    parse_rows,
+)
+from catalog import MountCatalog
+from parallel import RangeReader, count_quotes, mapped, read_header
+from parse_cache import file_digest
+from profiler import PROFILER
+
+# 聚合状态结构变化时递增, 旧状态会被丢弃并全量重建
+VERSION = 9
+
+# 计算已读取部分摘要时每次读取的字节数
+DIGEST_CHUNK_SIZE = 1 << 20
+
+
+def state_path(output: str) -> str:
+    return f"{output}.state"
+
+
+def mapping_key() -> str:
+    digest = blake2b(str(VERSION).encode(), digest_size=16)
+
+    for file in MAPPING_FILES:
+        digest.update(file_digest(file).encode())
+
+    return digest.hexdigest()
+
+
+def load_state(path: str, input_path: str, key: str, sketch: bool) -> dict | None:
+    if not os.path.exists(path):
+        return None
+
+    # 损坏或由其他程序写入的状态文件可能在反序列化时抛出任意异常, 均视为未命中
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except Exception:
+        return None
+
+    if (
+        not isinstance(state, dict)
+        or state.get("version") != VERSION
+        or state.get("key") != key
+        or state.get("input") != os.path.abspath(input_path)
+        or state.get("sketch") != sketch
+    ):
+        return None
+
+    return state
+
+
+def dump_state(path: str, state: dict) -> None:
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(f"{path}.tmp", path)
+
+
+def complete_end(buffer: mmap.mmap, start: int) -> int:
+    """start 之后最后一个以换行结尾的完整记录的结束位置"""
+    end = len(buffer)
+
+    while (newline := buffer.rfind(b"\n", start, end)) >= 0:
+        # start 为记录边界, 引号个数为偶数时换行符位于字段外
+        if count_quotes(buffer, start, newline) % 2 == 0:
+            return newline + 1
+
+        end = newline
+
+    return start
+
+
+def complete_tail(buffer: mmap.mmap, header: list, start: int) -> bool:
+    """
+    start 之后没有换行结尾的最后一条记录是否完整: 引号成对, 可以解码且字段数与表头一致.
+    文件不以换行结尾时为完整记录, 正在写入的半条记录通常缺少字段.
+    """
+    if start >= len(buffer) or count_quotes(buffer, start, len(buffer)) % 2:
+        return False
+
+    try:
+        rows = list(reader(io.StringIO(buffer[start:].decode("utf-8"), newline="")))
+    except (UnicodeDecodeError, Error):
+        return False
+
+    return len(rows) == 1 and len(rows[0]) == len(header)
+
+
+def update_digest(
+    digest: blake2b, buffer: mmap.mmap, start: int, end: int
+) -> blake2b:
+    """将 [start, end) 分块加入摘要, 已读取部分的任意位置被改写都会触发全量重建"""
+    for i in range(start, end, DIGEST_CHUNK_SIZE):
+        digest.update(buffer[i : min(i + DIGEST_CHUNK_SIZE, end)])
+
+    return digest
+
+
+def prefix_digest(buffer: mmap.mmap, end: int) -> blake2b:
+    """已读取部分 [0, end) 的摘要"""
+    return update_digest(blake2b(digest_size=16), buffer, 0, end)
+
+
+def add_range(
+    index: GroupIndex,
+    buffer: mmap.mmap,
+    header: list,
+    catalog: MountCatalog,
+    start: int,
+    end: int,
+) -> None:
+    with PROFILER.stage("read_csv") as stage:
+        text = io.TextIOWrapper(
+            io.BufferedReader(RangeReader(buffer, start, end)),
+            encoding="utf-8",
+            newline="",
+        )
+
+        rows = 0
+        for line in parse_rows(DictReader(text, fieldnames=header), catalog):
+            index.add(line)
+            rows += 1
+
+        stage.rows = rows
+
+
+def update_index(
+    path: str,
+    output: str,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+    mount_id_to_mount_group: dict,
+    sketch: bool = False,
+) -> GroupIndex:
+    """
+    从上次保存的聚合状态继续, 只解析上次读取位置之后追加的记录, 结果与全量计算一致.
+    已读取部分的任意字节发生变化时视为文件被改写, 丢弃状态并全量重建.
+    sketch 模式下各项数值只保存固定大小的分位数草图, 状态文件不随团队数增长.
+    """
+    key = mapping_key()
+    target = state_path(output)
+
+    fields = FIELDS | {SKETCH_FIELD} if sketch else FIELDS
+
+    # 导出程序可能先创建文件再写入表头, 空文件视为尚未读取任何内容, 不写入状态
+    if os.path.getsize(path) == 0:
+        return GroupIndex(mount_group, mount_id_to_mount_group, fields)
+
+    catalog = MountCatalog(mount_group, mount_id_to_force_id)
+
+    with open(path, "rb") as f, mapped(f) as buffer:
+        header, base = read_header(buffer)
+
+        state = load_state(target, path, key, sketch)
+
+        # 校验时得到的已读取部分摘要在读取新记录后继续累加, 整个文件每次只读取一遍
+        if state is not None and state["offset"] <= len(buffer):
+            digest = prefix_digest(buffer, state["offset"])
+
+            if state["digest"] != digest.hexdigest():
+                state = None
+        else:
+            state = None
+
+        if state is None:
+            state = {
+                "version": VERSION,
+                "key": key,
+                "input": os.path.abspath(path),
+                "sketch": sketch,
+                "offset": base,
+                "digest": None,
+                "index": GroupIndex(mount_group, mount_id_to_mount_group, fields),
+            }
+
+            digest = prefix_digest(buffer, base)
+
+        index = state["index"]
+
+        end = complete_end(buffer, state["offset"])
+
+        add_range(index, buffer, header, catalog, state["offset"], end)
+
+        state["digest"] = update_digest(
+            digest.copy(), buffer, state["offset"], end
+        ).hexdigest()
+        state["offset"] = end
+
+        dump_state(target, state)
+
+        # 末尾没有换行的完整记录计入本次结果, 与全量计算一致; 它可能仍在写入,
+        # 因此不写入状态, 下次从其起点重新读取
+        if complete_tail(buffer, header, end):
+            add_range(index, buffer, header, catalog, end, len(buffer))
+
+    return index
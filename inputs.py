@@ -0,0 +1,117 @@
+import glob
+import gzip
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictReader
+from typing import Dict, Iterable, List, Set, TextIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from analysis import FIELDS, GroupIndex, parse_rows
+from parallel import init_worker, worker_index
+from profiler import PROFILER
+
+COMPRESSED_SUFFIXES = (".gz", ".zst", ".zstd")
+
+
+def parse_events(values: List[str]) -> Dict[str, str]:
+    """NAME=PATH, 省略 NAME 时以文件名 (不含扩展名) 作为活动名"""
+    events = {}
+
+    for value in values:
+        name, sep, path = value.partition("=")
+
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(value))[0], value
+
+        events[name] = path
+
+    return events
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """展开通配符, 同一通配符匹配的文件按文件名排序, 整体保持参数顺序并去重"""
+    paths = []
+
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+
+            if not matches:
+                raise FileNotFoundError(f"no input matches {pattern}")
+        else:
+            matches = [pattern]
+
+        paths.extend(path for path in matches if path not in paths)
+
+    return paths
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(COMPRESSED_SUFFIXES)
+
+
+def open_input(path: str) -> TextIO:
+    """以文本流打开输入, gzip / zstd 压缩文件边读边解压, 不落盘"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+
+    if path.endswith((".zst", ".zstd")):
+        if zstandard is None:
+            raise RuntimeError(f"reading {path} requires the zstandard package")
+
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+
+        return io.TextIOWrapper(reader, encoding="utf-8", newline="")
+
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def aggregate_shard(part: int, path: str) -> GroupIndex:
+    """将单个分片流式聚合为可合并的部分结果, 团长行的顺序记为 (分片序号, 分片内序号)"""
+    catalog, index = worker_index()
+
+    with open_input(path) as f:
+        for line in parse_rows(DictReader(f), catalog):
+            index.add(line, part)
+
+    return index
+
+
+def build_shards_index(
+    paths: List[str],
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+    mount_id_to_mount_group: dict,
+    workers: int | None = None,
+    fields: Set[str] = FIELDS,
+) -> GroupIndex:
+    """
+    多个分片并发聚合后归约, 结果与按参数顺序拼接为一个文件后计算一致.
+    各部分结果按分片顺序合并: 草图的合并与顺序有关, 按完成先后合并时 --sketch 的结果会随进程数与调度变化.
+    """
+    mapping = (mount_group, mount_id_to_force_id, mount_id_to_mount_group)
+
+    index = GroupIndex(mount_group, mount_id_to_mount_group, fields)
+
+    if not paths:
+        return index
+
+    with PROFILER.stage("shard_aggregation"), ProcessPoolExecutor(
+        max_workers=min(workers or os.cpu_count() or 1, len(paths)),
+        initializer=init_worker,
+        initargs=(mapping, fields),
+    ) as executor:
+        partials = executor.map(aggregate_shard, range(len(paths)), paths)
+
+        for partial in partials:
+            with PROFILER.stage("shard_merge"):
+                index.merge(partial)
+
+    return index
@@ -0,0 +1,193 @@
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictReader, reader
+from typing import BinaryIO, List, Set, Tuple
+
+from analysis import FIELDS, GroupIndex, parse_rows
+from catalog import MountCatalog
+from profiler import PROFILER
+
+# 统计引号时每次切片的字节数
+MIN_RANGE_SIZE = 1 << 20
+
+# 每个字节范围的大小, 与进程数无关: 各范围按顺序合并, sketch 模式下结果只取决于输入
+RANGE_SIZE = 1 << 23
+
+# 工作进程内的映射表, 由 init_worker 设置
+_mapping: Tuple[dict, dict, dict] | None = None
+_fields: Set[str] = FIELDS
+
+
+def init_worker(mapping: Tuple[dict, dict, dict], fields: Set[str]) -> None:
+    global _mapping, _fields
+    _mapping, _fields = mapping, fields
+
+
+def worker_index() -> Tuple[MountCatalog, GroupIndex]:
+    """由工作进程内的映射表创建行解析所需的心法表与空索引"""
+    mount_group, mount_id_to_force_id, mount_id_to_mount_group = _mapping
+
+    return (
+        MountCatalog(mount_group, mount_id_to_force_id),
+        GroupIndex(mount_group, mount_id_to_mount_group, _fields),
+    )
+
+
+def mapped(f: BinaryIO) -> mmap.mmap:
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class RangeReader(io.RawIOBase):
+    """只读取文件 [start, end) 字节范围的原始流, 按需读取, 不复制整个范围"""
+
+    def __init__(self, buffer: mmap.mmap, start: int, end: int) -> None:
+        self.buffer = buffer
+        self.position = start
+        self.end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        size = min(len(target), self.end - self.position)
+
+        target[:size] = self.buffer[self.position : self.position + size]
+        self.position += size
+
+        return size
+
+
+def read_header(buffer: mmap.mmap) -> Tuple[List[str], int]:
+    end = buffer.find(b"\n")
+    end = len(buffer) if end < 0 else end + 1
+
+    header = next(reader(io.StringIO(buffer[:end].decode("utf-8"), newline="")))
+
+    return header, end
+
+
+def count_quotes(buffer: mmap.mmap, start: int, end: int) -> int:
+    # mmap 没有 count 方法, 分块切片计数以免复制整个区间
+    return sum(
+        buffer[i : min(i + MIN_RANGE_SIZE, end)].count(b'"')
+        for i in range(start, end, MIN_RANGE_SIZE)
+    )
+
+
+def record_boundary(buffer: mmap.mmap, position: int, start: int, quotes: int) -> int:
+    """
+    返回 position 之后第一个位于引号外的换行符的下一字节, start 之前共有 quotes 个引号.
+    引号个数为偶数时处于字段外, 转义的 "" 计两次, 不影响奇偶.
+    """
+    while True:
+        newline = buffer.find(b"\n", position)
+
+        if newline < 0:
+            return len(buffer)
+
+        if (quotes + count_quotes(buffer, start, newline)) % 2 == 0:
+            return newline + 1
+
+        position = newline + 1
+
+
+def split_ranges(
+    path: str, range_size: int = RANGE_SIZE
+) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    将输入按记录边界切分为约 range_size 字节的范围, 带引号的字段内的换行不会被切开.
+    切分位置只取决于输入, 与进程数无关.
+    """
+    with open(path, "rb") as f, mapped(f) as buffer:
+        header, base = read_header(buffer)
+
+        ranges = []
+        start = base
+        quotes = 0
+
+        while start < len(buffer):
+            end = record_boundary(buffer, start + range_size, start, quotes)
+
+            quotes += count_quotes(buffer, start, end)
+            ranges.append((start, end))
+
+            start = end
+
+    return header, ranges
+
+
+def parse_range(
+    path: str, header: List[str], part: int, start: int, end: int
+) -> GroupIndex:
+    """解析单个字节范围并预聚合, 团长行的顺序记为 (范围序号, 范围内序号)"""
+    catalog, index = worker_index()
+
+    with open(path, "rb") as f, mapped(f) as buffer:
+        text = io.TextIOWrapper(
+            io.BufferedReader(RangeReader(buffer, start, end)),
+            encoding="utf-8",
+            newline="",
+        )
+
+        for line in parse_rows(DictReader(text, fieldnames=header), catalog):
+            index.add(line, part)
+
+    return index
+
+
+def build_parallel_index(
+    path: str,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+    mount_id_to_mount_group: dict,
+    workers: int | None = None,
+    fields: Set[str] = FIELDS,
+    range_size: int = RANGE_SIZE,
+) -> GroupIndex:
+    """
+    内存映射输入文件, 按记录边界切分后由多个进程分别解析并预聚合, 再按范围顺序合并.
+    输出与逐行读取一致; sketch 模式下草图按范围合并, 结果与进程数无关,
+    输入超过一个范围时与逐行读取的近似结果不一定相同.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    index = GroupIndex(mount_group, mount_id_to_mount_group, fields)
+
+    # 空文件无法映射, 与逐行读取一样得到空结果
+    if os.path.getsize(path) == 0:
+        return index
+
+    with PROFILER.stage("split_ranges"):
+        header, ranges = split_ranges(path, range_size)
+
+    if not ranges:
+        return index
+
+    mapping = (mount_group, mount_id_to_force_id, mount_id_to_mount_group)
+
+    args = ([path] * len(ranges), [header] * len(ranges), range(len(ranges)))
+
+    # 只有一个进程时在当前进程内逐个解析, 不启动进程池
+    if min(workers, len(ranges)) == 1:
+        init_worker(mapping, fields)
+
+        with PROFILER.stage("parallel_parse"):
+            for partial in map(parse_range, *args, *zip(*ranges)):
+                index.merge(partial)
+
+        return index
+
+    with PROFILER.stage("parallel_parse"), ProcessPoolExecutor(
+        max_workers=min(workers, len(ranges)),
+        initializer=init_worker,
+        initargs=(mapping, fields),
+    ) as executor:
+        partials = executor.map(parse_range, *args, *zip(*ranges))
+
+        with PROFILER.stage("parallel_merge"):
+            for partial in partials:
+                index.merge(partial)
+
+    return index
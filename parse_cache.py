@@ -0,0 +1,290 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import Counter
+from hashlib import blake2b
+from typing import Dict, List, Tuple
+
+from analysis import MAPPING_FILES, STAT_MOUNT_GROUPS, load
+from catalog import Team
+from columnar import encode
+from profiler import PROFILER
+from record import Record
+
+MAGIC = b"DRPC"
+
+# 缓存格式或解析逻辑变化时递增, 旧缓存会被视为失效
+VERSION = 1
+
+HEADER = struct.Struct("<4sII")
+
+# 每个团队保存一次的整数阵容统计, 各占一列
+TEAM_COUNT_FIELDS = ("hps_count", "tank_count", "dps_count", "外攻", "内攻")
+
+
+def file_digest(path: str) -> str:
+    digest = blake2b(digest_size=16)
+
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def cache_key(path: str, mapping_files: Tuple[str, ...] = MAPPING_FILES) -> str:
+    digest = blake2b(f"{VERSION}:{sys.byteorder}".encode(), digest_size=16)
+
+    for file in (path, *mapping_files):
+        digest.update(file_digest(file).encode())
+
+    return digest.hexdigest()
+
+
+def cache_path(path: str, cache_dir: str) -> str:
+    name = blake2b(os.path.abspath(path).encode(), digest_size=4).hexdigest()
+
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{name}.cache")
+
+
+def dump_cache(data: List[Record], path: str, key: str) -> None:
+    strings = {"server": {}, "achieve_id": {}, "finish_time": {}}
+
+    columns: Dict[str, array] = {
+        "server": array("i"),
+        "achieve_id": array("i"),
+        "finish_time": array("i"),
+        "is_leader": array("b"),
+        "mount": array("i"),
+        "team": array("i"),
+        **{stat: array("d") for stat in STAT_MOUNT_GROUPS},
+        **{field: array("i") for field in TEAM_COUNT_FIELDS},
+        "mount_count_offset": array("q", [0]),
+        "mount_count_key": array("i"),
+        "mount_count_value": array("i"),
+        "force_count_offset": array("q", [0]),
+        "force_count_key": array("i"),
+        "force_count_value": array("i"),
+        "teammate_offset": array("q", [0]),
+        "teammate": array("B"),
+    }
+
+    # 成员行共享同一个 Team 对象, 以此识别团队
+    teams: Dict[int, int] = {}
+
+    nan = float("nan")
+
+    for line in data:
+        for name, table in strings.items():
+            columns[name].append(encode(table, line[name]))
+
+        columns["is_leader"].append(line["is_leader"] == "1")
+        columns["mount"].append(line["mount"])
+
+        for stat in STAT_MOUNT_GROUPS:
+            columns[stat].append(nan if line[stat] is None else line[stat])
+
+        if (team := teams.get(id(line["team"]))) is None:
+            team = teams[id(line["team"])] = len(teams)
+
+            for field in TEAM_COUNT_FIELDS:
+                columns[field].append(line[field])
+
+            for name in ("mount_count", "force_count"):
+                columns[f"{name}_key"].extend(line[name].keys())
+                columns[f"{name}_value"].extend(line[name].values())
+                columns[f"{name}_offset"].append(len(columns[f"{name}_key"]))
+
+            columns["teammate"].frombytes(line["team"].roster.encode("utf-8"))
+            columns["teammate_offset"].append(len(columns["teammate"]))
+
+        columns["team"].append(team)
+
+    layout = {}
+    offset = 0
+    for name, column in columns.items():
+        layout[name] = (offset, column.typecode, len(column))
+        offset += -(-len(column) * column.itemsize // 8) * 8
+
+    meta = json.dumps(
+        {
+            "key": key,
+            "rows": len(data),
+            "strings": {name: list(table) for name, table in strings.items()},
+            "columns": layout,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    start = -(-(HEADER.size + len(meta)) // 8) * 8
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(meta)))
+        f.write(meta)
+        f.write(b"\0" * (start - HEADER.size - len(meta)))
+
+        for name, column in columns.items():
+            raw = column.tobytes()
+            f.write(raw)
+            f.write(b"\0" * (-len(raw) % 8))
+
+    os.replace(f"{path}.tmp", path)
+
+
+def read_meta(mm: mmap.mmap) -> Tuple[dict, int] | None:
+    if len(mm) < HEADER.size:
+        return None
+
+    magic, version, size = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION or HEADER.size + size > len(mm):
+        return None
+
+    # 文件头完整但元数据被截断或损坏时视为未命中
+    try:
+        meta = json.loads(bytes(mm[HEADER.size : HEADER.size + size]))
+    except ValueError:
+        return None
+
+    if not isinstance(meta, dict):
+        return None
+
+    return meta, -(-(HEADER.size + size) // 8) * 8
+
+
+def load_cache(path: str, key: str) -> List[Record] | None:
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if (header := read_meta(mm)) is None or header[0].get("key") != key:
+                return None
+
+            meta, start = header
+
+            try:
+                columns = read_columns(mm, meta["columns"], start)
+            except (KeyError, TypeError, ValueError):
+                return None
+
+    if columns is None:
+        return None
+
+    # 列内容损坏 (如编码越界) 时重新解析
+    try:
+        return decode_cache(meta, columns)
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def read_columns(mm: mmap.mmap, layout: dict, start: int) -> Dict[str, list] | None:
+    """按元数据读取各列, 文件被截断导致列大小不符时返回 None"""
+    columns = {}
+    view = memoryview(mm)
+    try:
+        for name, (offset, typecode, length) in layout.items():
+            itemsize = array(typecode).itemsize
+
+            end = start + offset + length * itemsize
+            if offset < 0 or length < 0 or end > len(mm):
+                return None
+
+            with view[start + offset : end] as column:
+                columns[name] = (
+                    column.tobytes()
+                    if typecode == "B"
+                    else column.cast(typecode).tolist()
+                )
+    finally:
+        view.release()
+
+    return columns
+
+
+def decode_cache(meta: dict, columns: Dict[str, list]) -> List[Record]:
+    teams = []
+    teammate = columns["teammate"]
+    for i in range(len(columns["teammate_offset"]) - 1):
+        counts = {}
+
+        for name in ("mount_count", "force_count"):
+            lo, hi = columns[f"{name}_offset"][i : i + 2]
+            counts[name] = Counter(
+                dict(
+                    zip(columns[f"{name}_key"][lo:hi], columns[f"{name}_value"][lo:hi])
+                )
+            )
+
+        teams.append(
+            Team(
+                teammate[
+                    columns["teammate_offset"][i] : columns["teammate_offset"][i + 1]
+                ].decode("utf-8"),
+                counts["mount_count"],
+                counts["force_count"],
+                columns["hps_count"][i],
+                columns["tank_count"][i],
+                columns["外攻"][i],
+                columns["内攻"][i],
+            )
+        )
+
+    servers = meta["strings"]["server"]
+    achieve_ids = meta["strings"]["achieve_id"]
+    finish_times = meta["strings"]["finish_time"]
+
+    stats = [columns[stat] for stat in STAT_MOUNT_GROUPS]
+
+    data = []
+    for i in range(meta["rows"]):
+        # NaN 表示空值
+        values = [column[i] for column in stats]
+
+        data.append(
+            Record(
+                achieve_ids[columns["achieve_id"][i]],
+                servers[columns["server"][i]],
+                finish_times[columns["finish_time"][i]],
+                "1" if columns["is_leader"][i] else "0",
+                columns["mount"][i],
+                *(None if value != value else value for value in values),
+                teams[columns["team"][i]],
+            )
+        )
+
+    return data
+
+
+def load_cached(
+    path: str,
+    cache_dir: str,
+    mount_group: dict,
+    mount_id_to_force_id: dict,
+) -> List[Record]:
+    """读取解析缓存, 输入文件或映射表变化时自动重建"""
+    with PROFILER.stage("cache_key"):
+        key = cache_key(path)
+
+    target = cache_path(path, cache_dir)
+
+    with PROFILER.stage("cache_load") as stage:
+        data = load_cache(target, key)
+        stage.rows = len(data) if data is not None else 0
+
+    if data is not None:
+        return data
+
+    data = load(path, mount_group, mount_id_to_force_id)
+
+    with PROFILER.stage("cache_dump", len(data)):
+        dump_cache(data, target, key)
+
+    return data
@@ -0,0 +1,359 @@
+import os
+import pickle
+from argparse import ArgumentParser
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, NamedTuple
+
+from analysis import dump, load_mapping, rank, stream
+from inputs import parse_events
+from parse_cache import file_digest
+from profiler import PROFILER
+
+# 索引结构变化时递增, 旧索引会被丢弃并重建
+VERSION = 1
+
+STRING_KEYS = ("event", "boss", "server", "finish_time")
+
+# 出场记录的各列, next 为同一玩家的下一条出场记录, -1 表示最后一条
+APPEARANCE_COLUMNS = (
+    ("player", "i"),
+    ("event", "i"),
+    ("boss", "i"),
+    ("team", "i"),
+    ("mount", "i"),
+    ("next", "q"),
+)
+
+
+class Appearance(NamedTuple):
+    """玩家的单次出场"""
+
+    event: str
+    boss: str
+    server: str
+    finish_time: str
+    team: int
+    mount: int
+
+
+class PlayerIndex:
+    """
+    跨活动的玩家索引. global_role_id 映射为从 0 开始的玩家 ID, 每次出场的
+    (活动, BOSS, 团队, 心法) 追加到定长类型数组中, 同一玩家的出场以 next 链接,
+    查询单个玩家只访问其出场记录. 活动按输入文件摘要增量加入, 未变化的活动不会重复读取.
+    """
+
+    def __init__(self) -> None:
+        self.version = VERSION
+
+        # global_role_id -> 玩家 ID, 以及玩家最近一次出场的角色名
+        self.players: Dict[str, int] = {}
+        self.global_role_ids: List[str] = []
+        self.names: List[str] = []
+
+        # 各玩家首条与最后一条出场记录, -1 表示没有出场
+        self.first = array("q")
+        self.last = array("q")
+
+        # 活动名 -> 输入文件摘要
+        self.digests: Dict[str, str] = {}
+
+        # 活动 / BOSS / 区服 / 击杀时间的字典编码, labels 为编码到字符串的反查
+        self.strings: Dict[str, Dict[str, int]] = {key: {} for key in STRING_KEYS}
+        self.labels: Dict[str, List[str]] = {key: [] for key in STRING_KEYS}
+
+        # 以团长行为准的团队区服与击杀时间
+        self.team_server = array("i")
+        self.team_finish_time = array("i")
+
+        self.columns: Dict[str, array] = {
+            name: array(typecode) for name, typecode in APPEARANCE_COLUMNS
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns["player"])
+
+    def encode(self, key: str, value: str) -> int:
+        if (code := self.strings[key].get(value)) is None:
+            code = self.strings[key][value] = len(self.labels[key])
+            self.labels[key].append(value)
+
+        return code
+
+    def player_id(self, global_role_id: str, name: str = "") -> int:
+        if (player := self.players.get(global_role_id)) is None:
+            player = self.players[global_role_id] = len(self.global_role_ids)
+            self.global_role_ids.append(global_role_id)
+            self.names.append(name)
+            self.first.append(-1)
+            self.last.append(-1)
+        elif name:
+            self.names[player] = name
+
+        return player
+
+    def append(self, player: int, event: int, boss: int, team: int, mount: int) -> None:
+        appearance = len(self)
+
+        for name, value in (
+            ("player", player),
+            ("event", event),
+            ("boss", boss),
+            ("team", team),
+            ("mount", mount),
+            ("next", -1),
+        ):
+            self.columns[name].append(value)
+
+        if self.last[player] < 0:
+            self.first[player] = appearance
+        else:
+            self.columns["next"][self.last[player]] = appearance
+
+        self.last[player] = appearance
+
+    def add_event(
+        self, name: str, path: str, mount_group: dict, mount_id_to_force_id: dict
+    ) -> bool:
+        """加入活动的全部出场记录, 已加入且文件未变化时跳过, 变化时替换该活动"""
+        digest = file_digest(path)
+
+        if self.digests.get(name) == digest:
+            return False
+
+        if name in self.digests:
+            self.drop(name)
+
+        event = self.encode("event", name)
+
+        with PROFILER.stage("player_index") as stage:
+            start = len(self)
+
+            for chunk in stream(path, mount_group, mount_id_to_force_id):
+                for line in chunk:
+                    if line["is_leader"] != "1":
+                        continue
+
+                    team = len(self.team_server)
+                    self.team_server.append(self.encode("server", line["server"]))
+                    self.team_finish_time.append(
+                        self.encode("finish_time", line["finish_time"])
+                    )
+
+                    boss = self.encode("boss", line["achieve_id"])
+
+                    for member in line["teammate"]:
+                        # 缺少 global_role_id 的成员无法跨活动识别
+                        if not member.global_role_id:
+                            continue
+
+                        self.append(
+                            self.player_id(member.global_role_id, member.name),
+                            event,
+                            boss,
+                            team,
+                            member.mount_id,
+                        )
+
+            stage.rows = len(self) - start
+
+        self.digests[name] = digest
+
+        return True
+
+    def drop(self, name: str) -> None:
+        """删除活动的全部出场记录与团队, 重建出场链接, 玩家 ID 保持不变"""
+        event = self.strings["event"][name]
+
+        columns = {column: array(typecode) for column, typecode in APPEARANCE_COLUMNS}
+        team_server = array("i")
+        team_finish_time = array("i")
+        teams: Dict[int, int] = {}
+
+        self.first = array("q", [-1]) * len(self.global_role_ids)
+        self.last = array("q", [-1]) * len(self.global_role_ids)
+
+        old = self.columns
+        self.columns = columns
+
+        for player, code, boss, team, mount in zip(
+            old["player"], old["event"], old["boss"], old["team"], old["mount"]
+        ):
+            if code == event:
+                continue
+
+            if (new_team := teams.get(team)) is None:
+                new_team = teams[team] = len(team_server)
+                team_server.append(self.team_server[team])
+                team_finish_time.append(self.team_finish_time[team])
+
+            self.append(player, code, boss, new_team, mount)
+
+        self.team_server = team_server
+        self.team_finish_time = team_finish_time
+
+        del self.digests[name]
+
+    def appearances(self, global_role_id: str) -> Iterator[int]:
+        if (player := self.players.get(global_role_id)) is None:
+            return
+
+        appearance = self.first[player]
+        while appearance >= 0:
+            yield appearance
+            appearance = self.columns["next"][appearance]
+
+    def history(self, global_role_id: str) -> List[Appearance]:
+        """玩家按加入顺序的全部出场"""
+        labels = self.labels
+        columns = self.columns
+
+        return [
+            Appearance(
+                labels["event"][columns["event"][i]],
+                labels["boss"][columns["boss"][i]],
+                labels["server"][self.team_server[columns["team"][i]]],
+                labels["finish_time"][self.team_finish_time[columns["team"][i]]],
+                columns["team"][i],
+                columns["mount"][i],
+            )
+            for i in self.appearances(global_role_id)
+        ]
+
+    def codes(self, key: str, values: Iterable[str] | None) -> set | None:
+        if values is None:
+            return None
+
+        table = self.strings[key]
+
+        return {table[value] for value in values if value in table}
+
+    def server_rollup(
+        self, events: Iterable[str] | None = None, bosses: Iterable[str] | None = None
+    ) -> Dict[str, Counter]:
+        """
+        一次遍历全部出场记录, 按区服汇总出场次数与不同玩家数,
+        可只统计指定的活动与 BOSS.
+        """
+        events = self.codes("event", events)
+        bosses = self.codes("boss", bosses)
+
+        server_names = self.labels["server"]
+
+        appearance_count = Counter()
+        player_count = Counter()
+        seen = set()
+
+        for player, event, boss, team in zip(
+            self.columns["player"],
+            self.columns["event"],
+            self.columns["boss"],
+            self.columns["team"],
+        ):
+            if events is not None and event not in events:
+                continue
+            if bosses is not None and boss not in bosses:
+                continue
+
+            server = server_names[self.team_server[team]]
+
+            appearance_count[server] += 1
+
+            if (server, player) not in seen:
+                seen.add((server, player))
+                player_count[server] += 1
+
+        return {
+            "server_player_count": player_count,
+            "server_appearance_count": appearance_count,
+        }
+
+
+def load_index(path: str) -> PlayerIndex:
+    """读取 dump_index 保存的索引, 不存在或版本不一致时返回空索引"""
+    index = PlayerIndex()
+
+    if not os.path.exists(path):
+        return index
+
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return index
+
+    if isinstance(state, dict) and state.get("version") == VERSION:
+        index.__dict__.update(state)
+
+    return index
+
+
+def dump_index(index: PlayerIndex, path: str) -> None:
+    # 只保存属性, 不依赖 PlayerIndex 所在的模块名
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(vars(index), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(f"{path}.tmp", path)
+
+
+def main() -> None:
+    parser = ArgumentParser()
+
+    parser.add_argument("-i", "--input", type=str, action="append", default=[])
+    parser.add_argument("--index", type=str, default="players.index")
+    parser.add_argument("-o", "--output", type=str, default="players.json")
+    parser.add_argument("--player", type=str, default=None)
+    parser.add_argument("--events", type=str, default=None)
+    parser.add_argument("--boss", type=str, default=None)
+
+    args = parser.parse_args()
+
+    index = load_index(args.index)
+
+    if args.input:
+        mount_group, mount_id_to_force_id, _ = load_mapping()
+
+        changed = [
+            index.add_event(name, path, mount_group, mount_id_to_force_id)
+            for name, path in parse_events(args.input).items()
+        ]
+
+        if any(changed):
+            dump_index(index, args.index)
+
+    if args.player is not None:
+        history = index.history(args.player)
+
+        player = index.players.get(args.player)
+
+        dump(
+            {
+                "global_role_id": args.player,
+                "name": index.names[player] if player is not None else None,
+                "event_count": rank(Counter(item.event for item in history)),
+                "mount_attendance_count": rank(Counter(item.mount for item in history)),
+                "appearance": [item._asdict() for item in history],
+            },
+            args.output,
+        )
+        return
+
+    events = args.events.split(",") if args.events else None
+    boss_lst = args.boss.split(",") if args.boss else []
+
+    rollups = {"all": index.server_rollup(events)}
+    for boss in boss_lst:
+        rollups[boss] = index.server_rollup(events, [boss])
+
+    dump(
+        {
+            name: {key: rank(rollup[name]) for key, rollup in rollups.items()}
+            for name in ("server_player_count", "server_appearance_count")
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import json
+import resource
+import tracemalloc
+from time import perf_counter, process_time
+from typing import Dict, List
+
+
+class NullStage:
+    """未启用分析时使用的空阶段, 进入与退出均不做任何事"""
+
+    __slots__ = ()
+
+    # 行数写入直接丢弃
+    rows = property(lambda self: 0, lambda self, value: None)
+
+    def __enter__(self) -> "NullStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    __slots__ = ("profiler", "name", "rows", "wall", "cpu", "peak_traced")
+
+    def __init__(self, profiler: "Profiler", name: str, rows: int) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.peak_traced = 0
+
+    def __enter__(self) -> "Stage":
+        self.profiler.enter(self)
+
+        self.wall = perf_counter()
+        self.cpu = process_time()
+
+        return self
+
+    def __exit__(self, *exc) -> None:
+        wall = perf_counter() - self.wall
+        cpu = process_time() - self.cpu
+
+        self.profiler.exit(self, wall, cpu)
+
+
+class Profiler:
+    """按阶段统计耗时 / CPU 时间 / 行数 / 峰值内存, 同名阶段的多次调用会累加"""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.trace_memory = False
+
+        self.records: Dict[str, dict] = {}
+        self.stack: List[Stage] = []
+
+    def enable(self, trace_memory: bool = False) -> None:
+        self.enabled = True
+        self.trace_memory = trace_memory
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name: str, rows: int = 0) -> Stage | NullStage:
+        if not self.enabled:
+            return NULL_STAGE
+
+        return Stage(self, name, rows)
+
+    def fold_peak(self) -> None:
+        # tracemalloc 只有一个全局峰值, 重置前先计入所有未结束的外层阶段
+        _, peak = tracemalloc.get_traced_memory()
+
+        for stage in self.stack:
+            stage.peak_traced = max(stage.peak_traced, peak)
+
+        tracemalloc.reset_peak()
+
+    def enter(self, stage: Stage) -> None:
+        if self.trace_memory:
+            self.fold_peak()
+
+        self.stack.append(stage)
+
+    def exit(self, stage: Stage, wall: float, cpu: float) -> None:
+        if self.trace_memory:
+            self.fold_peak()
+
+        self.stack.pop()
+
+        record = self.records.setdefault(
+            stage.name,
+            {
+                "calls": 0,
+                "wall_seconds": 0.0,
+                "cpu_seconds": 0.0,
+                "rows": 0,
+                "peak_traced_mb": None,
+            },
+        )
+
+        record["calls"] += 1
+        record["wall_seconds"] += wall
+        record["cpu_seconds"] += cpu
+        record["rows"] += stage.rows
+        record["rows_per_second"] = (
+            record["rows"] / record["wall_seconds"]
+            if record["rows"] and record["wall_seconds"]
+            else None
+        )
+        # Linux 下 ru_maxrss 单位为 KB, 为进程启动以来的峰值
+        record["peak_rss_mb"] = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        )
+
+        if self.trace_memory:
+            record["peak_traced_mb"] = max(
+                record["peak_traced_mb"] or 0, stage.peak_traced / 1024 / 1024
+            )
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.records, f, ensure_ascii=False, indent=2)
+
+
+PROFILER = Profiler()
@@ -0,0 +1,70 @@
+from catalog import Team
+
+# 团队阵容统计字段, 由同一团队的所有行共享, 从 team 中读取
+TEAM_FIELDS = (
+    "teammate",
+    "lineup",
+    "mount_count",
+    "force_count",
+    "hps_count",
+    "tank_count",
+    "dps_count",
+    "外攻",
+    "内攻",
+)
+
+
+class Record:
+    """
+    解析后的单行数据, 以 __slots__ 保存, 不为每行创建 dict.
+    支持与 dict 行相同的 line["server"] 下标访问, 统计代码无需修改;
+    阵容统计保存在共享的 team 中, 成员行为 None.
+    """
+
+    __slots__ = (
+        "achieve_id",
+        "server",
+        "finish_time",
+        "is_leader",
+        "mount",
+        "dps",
+        "damage",
+        "hps",
+        "therapy",
+        "team",
+    )
+
+    # 下标访问直接使用 C 实现的属性查找, 与 dict 取值开销相当
+    __getitem__ = object.__getattribute__
+
+    def __init__(
+        self,
+        achieve_id: str,
+        server: str,
+        finish_time: str,
+        is_leader: str,
+        mount: int,
+        dps: float | None,
+        damage: float | None,
+        hps: float | None,
+        therapy: float | None,
+        team: Team | None = None,
+    ) -> None:
+        self.achieve_id = achieve_id
+        self.server = server
+        self.finish_time = finish_time
+        self.is_leader = is_leader
+        self.mount = mount
+        self.dps = dps
+        self.damage = damage
+        self.hps = hps
+        self.therapy = therapy
+        self.team = team
+
+
+def team_field(name: str) -> property:
+    return property(lambda self: self.team[name])
+
+
+for _field in TEAM_FIELDS:
+    setattr(Record, _field, team_field(_field))
@@ -0,0 +1,123 @@
+from typing import Dict, Hashable, Iterable, List, Mapping, Sequence, Tuple
+
+Values = Sequence[float | int]
+
+
+# 样本数不少于此值时以快速选择代替排序; 更小的分组 C 实现的 sorted 更快
+SELECT_MIN_SIZE = 1 << 13
+
+
+def select(values: Values, ks: Sequence[int], offset: int, result: dict) -> None:
+    """三路划分的快速选择, 将 values 中排名 offset + k 的样本写入 result, ks 已排序"""
+    if len(values) < 32:
+        lst = sorted(values)
+
+        for k in ks:
+            result[k] = lst[k - offset]
+
+        return
+
+    pivot = sorted((values[0], values[len(values) // 2], values[-1]))[1]
+
+    lower = [i for i in values if i < pivot]
+    upper = [i for i in values if i > pivot]
+
+    # 等于 pivot 的样本排名位于 [start, end)
+    start = offset + len(lower)
+    end = offset + len(values) - len(upper)
+
+    if lower_ks := [k for k in ks if k < start]:
+        select(lower, lower_ks, offset, result)
+
+    for k in ks:
+        if start <= k < end:
+            result[k] = pivot
+
+    if upper_ks := [k for k in ks if k >= end]:
+        select(upper, upper_ks, end, result)
+
+
+def order_statistics(values: Values, ks: Sequence[int]) -> List[float | int]:
+    """与 sorted(values)[k] 语义相同, k 可为负数. 大分组使用快速选择, 只划分包含 k 的一侧"""
+    n = len(values)
+
+    ks = [k % n for k in ks]
+
+    if n < SELECT_MIN_SIZE:
+        lst = sorted(values)
+
+        return [lst[k] for k in ks]
+
+    result = {}
+    select(values, sorted(set(ks)), 0, result)
+
+    return [result[k] for k in ks]
+
+
+def percentiles(values: Values, ps: Sequence[int]) -> List[float | int]:
+    """第 p 百分位数取排序后第 min(n * p // 100, n - 1) 个样本"""
+    n = len(values)
+
+    return order_statistics(values, [min(n * p // 100, n - 1) for p in ps])
+
+
+def iqr_bounds(
+    Q1: float | int, Q3: float | int, coefficient: float | int = 1.5
+) -> Tuple[float, float]:
+    IQR = Q3 - Q1
+
+    return Q1 - coefficient * IQR, Q3 + coefficient * IQR
+
+
+def IQR(lst: List[float | int], *, coefficient: float | int = 1.5) -> List[float | int]:
+    lst = sorted(lst)
+
+    idx = len(lst) // 4
+
+    lower, upper = iqr_bounds(lst[idx], lst[-idx], coefficient)
+
+    return [i for i in lst if lower <= i <= upper]
+
+
+def MAD(lst: List[float | int], *, coefficient: float | int = 2) -> List[float | int]:
+    (median,) = order_statistics(lst, [len(lst) // 2])
+
+    # 原实现对未取绝对值的有符号误差排序后取 error[idx], 即 lst[idx] - median, 恒为 0,
+    # 只保留与中位数相等的样本. 没有指标使用 MAD, 保持该行为不变, 不再排序误差
+    MAD = 0
+
+    return [
+        i for i in lst if median - MAD * coefficient <= i <= median + MAD * coefficient
+    ]
+
+
+def iqr_mean(values: Values, *, coefficient: float | int = 1.5) -> float:
+    """
+    IQR 过滤后的平均值, 与 sum(IQR(lst)) / len(IQR(lst)) 逐位一致.
+    浮点数须按排序后的顺序累加才能逐位一致, 因此每个分组仍完整排序一次, 不使用快速选择;
+    快速选择只用于分位数指标与 MAD.
+    """
+    kept = IQR(values, coefficient=coefficient)
+
+    return sum(kept) / len(kept)
+
+
+def filtered_means(
+    groups: Mapping[Hashable, Values],
+    keys: Iterable[Hashable] | None = None,
+    *,
+    coefficient: float | int = 1.5,
+) -> Dict[Hashable, float]:
+    """
+    逐个分组调用 iqr_mean, 按 keys 的顺序输出, 空分组跳过.
+    各分组独立排序, 与分别调用 iqr_mean 的开销相同.
+    """
+    result = {}
+
+    for key in groups if keys is None else keys:
+        values = groups.get(key)
+
+        if values is not None and len(values):
+            result[key] = iqr_mean(values, coefficient=coefficient)
+
+    return result
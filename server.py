@@ -0,0 +1,190 @@
+import os
+import threading
+from argparse import ArgumentParser
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Hashable, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from analysis import (
+    METRICS,
+    GroupIndex,
+    build_index,
+    build_response,
+    dumps,
+    load_mapping,
+    resolve_metrics,
+)
+from inputs import parse_events
+
+
+class LRUCache:
+    """按条目数限制大小的 LRU 缓存, 可被多个请求线程同时访问"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> bytes | None:
+        with self.lock:
+            if (value := self.entries.get(key)) is not None:
+                self.entries.move_to_end(key)
+
+            return value
+
+    def put(self, key: Hashable, value: bytes) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, event: str) -> None:
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == event]:
+                del self.entries[key]
+
+
+class Dataset:
+    """常驻内存的单个活动聚合索引, 输入文件的大小或修改时间变化时重新加载"""
+
+    def __init__(self, name: str, path: str, mapping: Tuple[dict, dict, dict]) -> None:
+        self.name = name
+        self.path = path
+        self.mapping = mapping
+
+        self.lock = threading.Lock()
+        self.signature: Tuple[int, int] | None = None
+        self.index: GroupIndex | None = None
+
+    def stat(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def current(self, cache: LRUCache) -> Tuple[GroupIndex, Tuple[int, int]]:
+        signature = self.stat()
+
+        with self.lock:
+            if signature != self.signature:
+                cache.invalidate(self.name)
+
+                # 累加全部已注册指标的字段, 可选指标同样可以查询
+                self.index = build_index(
+                    self.path, *self.mapping, streaming=True, metrics=list(METRICS)
+                )
+                self.signature = signature
+
+            return self.index, self.signature
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    GET /events 列出活动;
+    GET /query?event=<活动>&boss=<BOSS_ID,...>&metrics=<指标,...>
+    返回与输出文件相同结构的 JSON, metrics 缺省时返回全部指标.
+    """
+
+    server: "QueryServer"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/events":
+            return self.reply(200, dumps(sorted(self.server.datasets)).encode())
+
+        if url.path != "/query":
+            return self.error(404, f"unknown path {url.path}")
+
+        if (dataset := self.server.datasets.get(query.get("event", ""))) is None:
+            return self.error(400, f"unknown event {query.get('event')}")
+
+        boss_lst = [boss for boss in query.get("boss", "").split(",") if boss]
+
+        try:
+            metrics = resolve_metrics(
+                query["metrics"].split(",") if query.get("metrics") else None
+            )
+        except ValueError as e:
+            return self.error(400, str(e))
+
+        # 活动文件被删除或改名时返回错误, 不中断连接
+        try:
+            index, signature = dataset.current(self.server.cache)
+        except FileNotFoundError:
+            return self.error(404, f"input of event {dataset.name} not found")
+        except Exception as e:
+            return self.error(500, f"failed to load event {dataset.name}: {e}")
+
+        key = (dataset.name, signature, tuple(boss_lst), tuple(metrics))
+
+        if (body := self.server.cache.get(key)) is None:
+            body = dumps(build_response(index, boss_lst, metrics)).encode()
+            self.server.cache.put(key, body)
+
+        self.reply(200, body)
+
+    def error(self, status: int, message: str) -> None:
+        self.reply(status, dumps({"error": message}).encode())
+
+    def reply(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, address: Tuple[str, int], datasets: Dict[str, Dataset], cache_size: int
+    ) -> None:
+        super().__init__(address, QueryHandler)
+
+        self.datasets = datasets
+        self.cache = LRUCache(cache_size)
+
+
+def main() -> None:
+    parser = ArgumentParser()
+
+    parser.add_argument("-i", "--input", type=str, action="append", required=True)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, default=256)
+
+    args = parser.parse_args()
+
+    mapping = load_mapping()
+
+    datasets = {
+        name: Dataset(name, path, mapping)
+        for name, path in parse_events(args.input).items()
+    }
+
+    server = QueryServer((args.host, args.port), datasets, args.cache_size)
+
+    # 启动时预先加载, 首个请求不必等待解析
+    for dataset in datasets.values():
+        dataset.current(server.cache)
+
+    print(f"serving {', '.join(datasets)} on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from typing import Dict, Iterable, List, Tuple
+
+from analysis import (
+    METRICS,
+    BossGroup,
+    GroupIndex,
+    metric_fields,
+    rank,
+    resolve_metrics,
+)
+from profiler import PROFILER
+
+# 工作进程内的空索引与指标, 由 init_worker 设置; fork 启动时还包括继承的全部分片
+_shards: Dict[str, List[Tuple[int, dict]]] = {}
+_index: GroupIndex | None = None
+_metrics: List[str] = []
+
+
+def init_worker(
+    shards: Dict[str, List[Tuple[int, dict]]], index: GroupIndex, metrics: List[str]
+) -> None:
+    global _shards, _index, _metrics
+    _shards, _index, _metrics = shards, index, metrics
+
+
+def compute_shard(
+    shard: str | List[Tuple[int, dict]],
+) -> Tuple[BossGroup, Dict[str, dict]]:
+    """
+    聚合单个 BOSS 的 (行号, 行) 并计算其指标, 只返回聚合结果.
+    shard 为 BOSS 时从 fork 继承的分片中读取, 否则为随任务传入的分片.
+    """
+    if isinstance(shard, str):
+        shard = _shards[shard]
+
+    group = _index.new_group()
+
+    for position, line in shard:
+        _index.update(line, position, group)
+
+    metrics = {
+        name: rank(METRICS[name](group, _index.mount_group)) for name in _metrics
+    }
+
+    return group, metrics
+
+
+def build_sharded_response(
+    data: List[dict],
+    boss_lst: List[str],
+    mount_group: dict,
+    mount_id_to_mount_group: dict,
+    workers: int,
+    metrics: Iterable[str] | None = None,
+) -> dict:
+    """
+    按 achieve_id 分片并行聚合并计算各 BOSS 指标, 合并分片结果得到 "all", 与串行结果一致.
+    fork 启动的工作进程直接继承已读取的分片, 任务只传入 BOSS; 不支持 fork 的平台上
+    每个分片随各自的任务序列化, 每个进程只反序列化分配给它的分片.
+    """
+    shards = defaultdict(list)
+
+    for position, line in enumerate(data):
+        shards[line["achieve_id"]].append((position, line))
+
+    metrics = resolve_metrics(metrics)
+
+    index = GroupIndex(mount_group, mount_id_to_mount_group, metric_fields(metrics))
+
+    fork = "fork" in get_all_start_methods()
+
+    with PROFILER.stage("sharded_metrics", len(data)), ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("fork") if fork else None,
+        initializer=init_worker,
+        initargs=(shards if fork else {}, index, metrics),
+    ) as executor:
+        tasks = list(shards) if fork else list(shards.values())
+
+        partials = dict(zip(shards, executor.map(compute_shard, tasks)))
+
+    with PROFILER.stage("sharded_merge"):
+        merged = index.new_group()
+
+        for group, _ in partials.values():
+            merged.merge(group)
+
+    empty = index.new_group()
+
+    response = {}
+
+    for name in metrics:
+        response[name] = {"all": rank(METRICS[name](merged, mount_group))}
+
+        for boss in boss_lst:
+            if boss in partials:
+                response[name][boss] = partials[boss][1][name]
+            else:
+                response[name][boss] = rank(METRICS[name](empty, mount_group))
+
+    return response
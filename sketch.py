@@ -0,0 +1,148 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from math import ceil
+from typing import List, Sequence, Tuple
+
+from robust import iqr_bounds
+
+# 最高层压缩器的容量, 秩误差约为 1.7 / DEFAULT_K, 样本数少于该值时结果精确
+DEFAULT_K = 200
+
+# 逐层向下容量按该比例递减
+CAPACITY_RATIO = 2 / 3
+
+
+class QuantileSketch:
+    """
+    KLL 分位数草图: 第 h 层的每个样本代表 2 ** h 个原始样本,
+    某层装满时排序后隔一取一提升到上一层, 总容量约 3 * k, 与样本数无关.
+    压缩时交替取奇偶位置而非随机取样, 相同输入与合并顺序得到相同结果.
+    """
+
+    __slots__ = ("k", "n", "size", "flips", "levels")
+
+    def __init__(self, k: int = DEFAULT_K) -> None:
+        self.k = k
+        self.n = 0
+        self.size = 0
+        self.flips = 0
+        self.levels: List[array] = [array("d")]
+
+    def __len__(self) -> int:
+        return self.n
+
+    def capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+
+        return max(ceil(self.k * CAPACITY_RATIO**depth), 2)
+
+    def max_size(self) -> int:
+        return sum(self.capacity(level) for level in range(len(self.levels)))
+
+    def append(self, value: float) -> None:
+        self.levels[0].append(value)
+        self.n += 1
+        self.size += 1
+
+        if self.size >= self.max_size():
+            self.compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(array("d"))
+
+        for level, values in zip(self.levels, other.levels):
+            level.extend(values)
+
+        self.n += other.n
+        self.size += other.size
+        self.flips += other.flips
+
+        self.compress()
+
+    def compress(self) -> None:
+        while self.size >= self.max_size():
+            level = next(
+                h
+                for h, values in enumerate(self.levels)
+                if len(values) >= self.capacity(h)
+            )
+
+            if level + 1 == len(self.levels):
+                self.levels.append(array("d"))
+
+            values = sorted(self.levels[level])
+
+            # 奇数个样本时保留最大的一个, 其余两两提升一个
+            kept = array("d", values[-1:] if len(values) % 2 else ())
+            promoted = values[self.flips % 2 : len(values) - len(kept) : 2]
+
+            self.flips += 1
+
+            self.levels[level] = kept
+            self.levels[level + 1].extend(promoted)
+            self.size -= len(values) - len(kept) - len(promoted)
+
+    def to_list(self) -> list:
+        """可 JSON 序列化的 [k, n, flips, 各层样本]"""
+        return [self.k, self.n, self.flips, [values.tolist() for values in self.levels]]
+
+    @classmethod
+    def from_list(cls, data: list) -> "QuantileSketch":
+        k, n, flips, levels = data
+
+        sketch = cls(k)
+        sketch.n = n
+        sketch.flips = flips
+        sketch.levels = [array("d", values) for values in levels]
+        sketch.size = sum(len(values) for values in levels)
+
+        return sketch
+
+    def weighted(self) -> Tuple[List[float], List[int]]:
+        items = sorted(
+            (value, 1 << level)
+            for level, values in enumerate(self.levels)
+            for value in values
+        )
+
+        return [value for value, _ in items], [weight for _, weight in items]
+
+    @staticmethod
+    def at_rank(values: List[float], cumulative: List[int], rank: int) -> float:
+        # 第一个累计权重超过 rank 的样本, 即排序后第 rank 个 (从 0 开始) 原始样本的估计
+        return values[bisect_right(cumulative, rank)]
+
+    def percentiles(self, ps: Sequence[int]) -> List[float]:
+        """与 robust.percentiles 相同, 取排序后第 min(n * p // 100, n - 1) 个样本"""
+        values, weights = self.weighted()
+        cumulative = list(accumulate(weights))
+
+        return [
+            self.at_rank(values, cumulative, min(self.n * p // 100, self.n - 1))
+            for p in ps
+        ]
+
+    def iqr_mean(self, *, coefficient: float | int = 1.5) -> float:
+        """与 robust.iqr_mean 的分位点定义一致, 未发生压缩时结果逐位相同"""
+        values, weights = self.weighted()
+        cumulative = list(accumulate(weights))
+
+        idx = self.n // 4
+
+        lower, upper = iqr_bounds(
+            self.at_rank(values, cumulative, idx),
+            self.at_rank(values, cumulative, (self.n - idx) % self.n),
+            coefficient,
+        )
+
+        total = 0.0
+        count = 0
+
+        for value, weight in zip(values, weights):
+            if lower <= value <= upper:
+                total += value * weight
+                count += weight
+
+        return total / count
@@ -0,0 +1,35 @@
+import random
+
+from analysis import build_index
+from conftest import ROSTERS, write_event
+from cube import Cube
+
+
+def test_dump_load(tmp_path, mapping):
+    path = tmp_path / "event.csv"
+    write_event(path, ROSTERS * 400)
+
+    cube = build_index(str(path), *mapping, cube=True).cube
+
+    # 样本数超过草图容量时, 计数与总和仍精确
+    rng = random.Random(0)
+    values = [rng.random() for _ in range(5000)]
+
+    for value in values:
+        row = dict.fromkeys(cube.stats, None)
+        row.update(achieve_id="8548", server="梦江南", is_leader="0", mount=10026)
+        row["dps"] = value
+
+        cube.add(row)
+
+    cube.dump(str(tmp_path / "cube.json.gz"))
+    loaded = Cube.load(str(tmp_path / "cube.json.gz"))
+
+    for measure in ("attendance", "teams", "dps", "dps_count", "hps_sum"):
+        assert loaded.query(measure, "mount") == cube.query(measure, "mount")
+
+    cell = loaded.rollup(mount=10026)[()]
+
+    assert cell.value("dps_count") == len(values)
+    assert cell.value("dps_sum") == sum(values)
+    assert cell.stat["dps"].size < 1000
@@ -0,0 +1,102 @@
+import pickle
+from hashlib import blake2b
+
+import pytest
+
+from analysis import build_index, build_response, dumps
+from conftest import ROSTERS, write_event
+
+
+def incremental_response(path, mapping) -> str:
+    index = build_index(path, *mapping, incremental_output=f"{path}.json")
+    return dumps(build_response(index, ["8548"]))
+
+
+def full_response(path, mapping) -> str:
+    return dumps(build_response(build_index(path, *mapping), ["8548"]))
+
+
+def test_unterminated_final_record(tmp_path, mapping):
+    path = tmp_path / "event.csv"
+    write_event(path)
+
+    # 最后一条记录没有换行结尾
+    path.write_bytes(path.read_bytes().rstrip(b"\r\n"))
+
+    assert incremental_response(path, mapping) == full_response(path, mapping)
+
+    # 该记录未写入状态, 补全换行并追加后仍与全量计算一致
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        f.write("\r\n")
+    write_event(path, ROSTERS, len(ROSTERS))
+
+    assert incremental_response(path, mapping) == full_response(path, mapping)
+
+
+def test_partial_final_record(tmp_path, mapping):
+    path = tmp_path / "event.csv"
+    write_event(path)
+
+    expected = incremental_response(path, mapping)
+
+    # 追加写入到一半的记录, 缺少字段时不计入结果
+    with open(path, "ab") as f:
+        f.write(b"3,\xe6\xa2\xa6\xe6\xb1\x9f\xe5\x8d\x97,8548,1680000003,1,1,1")
+
+    assert incremental_response(path, mapping) == expected
+
+
+def test_rewritten_prefix(tmp_path, mapping):
+    path = tmp_path / "event.csv"
+    write_event(path, ROSTERS * 400)
+
+    incremental_response(path, mapping)
+
+    # 原地改写第一条记录, 文件长度不变
+    data = path.read_bytes()
+    path.write_bytes(data.replace(b",10062,100000,", b",10003,100000,", 1))
+
+    assert incremental_response(path, mapping) == full_response(path, mapping)
+
+
+@pytest.mark.parametrize(
+    "state",
+    [
+        pickle.dumps([1, 2, 3]),
+        # 引用不存在模块的 pickle
+        b"cno_such_module\nState\n.",
+    ],
+)
+def test_invalid_state(tmp_path, mapping, state):
+    path = tmp_path / "event.csv"
+    write_event(path)
+
+    (tmp_path / "event.csv.json.state").write_bytes(state)
+
+    assert incremental_response(path, mapping) == full_response(path, mapping)
+
+
+def test_empty_file(tmp_path, mapping):
+    path = tmp_path / "event.csv"
+    path.write_bytes(b"")
+
+    assert incremental_response(path, mapping) == full_response(path, mapping)
+    assert not (tmp_path / "event.csv.json.state").exists()
+
+    # 写入表头与记录后从头读取
+    write_event(path)
+
+    assert incremental_response(path, mapping) == full_response(path, mapping)
+
+    # 追加后累加的摘要与整个已读取部分的摘要一致
+    write_event(path, ROSTERS, len(ROSTERS))
+
+    assert incremental_response(path, mapping) == full_response(path, mapping)
+
+    with open(tmp_path / "event.csv.json.state", "rb") as f:
+        state = pickle.load(f)
+
+    data = path.read_bytes()
+
+    assert state["offset"] == len(data)
+    assert state["digest"] == blake2b(data, digest_size=16).hexdigest()
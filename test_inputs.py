@@ -0,0 +1,68 @@
+import csv
+import random
+
+from analysis import (
+    PERCENTILE_METRICS,
+    SKETCH_FIELD,
+    build_response,
+    dumps,
+    metric_fields,
+    resolve_metrics,
+)
+from conftest import FIELDNAMES, ROSTERS, event_row
+from inputs import build_shards_index
+from parallel import build_parallel_index
+
+METRICS = resolve_metrics(None) + PERCENTILE_METRICS
+
+FIELDS = metric_fields(METRICS) | {SKETCH_FIELD}
+
+
+def write_rows(path, start: int, size: int, rng: random.Random) -> None:
+    """写入团队 ID 为 [start, start + size) 的团长记录, 团长为外攻心法, DPS 随机"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, FIELDNAMES)
+        writer.writeheader()
+
+        for team_id in range(start, start + size):
+            row = event_row(team_id, ROSTERS[team_id % len(ROSTERS)])
+            row.update(mount=10026, dps=rng.randrange(1000000))
+            writer.writerow(row)
+
+
+def sketch_response(index) -> str:
+    return dumps(build_response(index, ["8548"], METRICS))
+
+
+def test_sketch_independent_of_workers(tmp_path, mapping):
+    # 大小不一的分片, 样本数超过草图容量, 合并顺序影响结果
+    rng = random.Random(0)
+    paths = []
+    start = 0
+
+    for part, size in enumerate((6000, 60, 450, 15)):
+        paths.append(str(tmp_path / f"part{part}.csv"))
+        write_rows(paths[-1], start, size, rng)
+        start += size
+
+    responses = {
+        sketch_response(build_shards_index(paths, *mapping, workers, FIELDS))
+        for workers in (1, 2, 4)
+    }
+
+    assert len(responses) == 1
+
+
+def test_single_file_sketch_independent_of_workers(tmp_path, mapping):
+    path = tmp_path / "event.csv"
+    write_rows(path, 0, 6000, random.Random(0))
+
+    # 按较小的字节范围切分, 文件被分为数十个范围
+    responses = {
+        sketch_response(
+            build_parallel_index(str(path), *mapping, workers, FIELDS, 1 << 14)
+        )
+        for workers in (1, 2, 3)
+    }
+
+    assert len(responses) == 1
@@ -0,0 +1,140 @@
+import csv
+import gzip
+import sys
+from importlib.util import find_spec
+
+import pytest
+
+import DungeonRankAnalysis
+import parallel
+from synthetic import generate
+
+# 单个输入的各种读取方式, 结果应与默认的逐行读取一致
+MODES = [
+    [],
+    ["--stream"],
+    ["-w", "2"],
+    ["--mmap"],
+    ["--cache-dir", "cache"],
+    ["--cache-dir", "cache", "-w", "2"],
+    ["--db", "event.sqlite"],
+    ["--incremental"],
+    pytest.param(
+        ["--columnar"],
+        marks=pytest.mark.skipif(find_spec("numpy") is None, reason="requires numpy"),
+    ),
+]
+
+BOSSES = "10000,10001,10002"
+
+
+def run(monkeypatch, inputs: list, *args: str) -> str:
+    """以命令行参数运行脚本, 返回输出文件的内容"""
+    monkeypatch.setattr(
+        sys, "argv", ["DungeonRankAnalysis.py", "-i", *inputs, "-o", "out.json", *args]
+    )
+
+    DungeonRankAnalysis.main()
+
+    with open("out.json", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("mode", MODES, ids=" ".join)
+def test_empty_input(tmp_path, mapping, monkeypatch, mode):
+    # 导出程序可能先创建文件再写入表头
+    (tmp_path / "empty.csv").write_bytes(b"")
+
+    expected = run(monkeypatch, ["empty.csv"], "--boss", "8548")
+
+    assert run(monkeypatch, ["empty.csv"], "--boss", "8548", *mode) == expected
+
+
+def test_empty_shards(tmp_path, mapping, monkeypatch):
+    (tmp_path / "empty.csv").write_bytes(b"")
+    (tmp_path / "empty.csv.gz").write_bytes(gzip.compress(b""))
+
+    expected = run(monkeypatch, ["empty.csv"], "--boss", "8548")
+
+    inputs = ["empty.csv", "empty.csv.gz"]
+
+    for workers in ("1", "2"):
+        assert run(monkeypatch, inputs, "--boss", "8548", "-w", workers) == expected
+
+
+def season_rows(tmp_path, mapping) -> list:
+    """
+    合成数据的全部行 (含表头), 含空数值与未通过校验的行; 击杀时间取整到小时,
+    大量团队的 finish_time 相同, 角色名中的换行使 name / teammate 字段带引号跨行
+    """
+    generate(str(tmp_path / "synthetic.csv"), 120, 3, 4, mapping=mapping)
+
+    with open(tmp_path / "synthetic.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+
+    header = rows[0]
+    finish_time = header.index("finish_time")
+
+    for row in rows[1:]:
+        row[finish_time] = str(int(row[finish_time]) // 3600 * 3600)
+        row[:] = [value.replace("·", "\n") for value in row]
+
+    return rows
+
+
+def write_rows(path, rows: list, mode: str = "w") -> None:
+    opener = gzip.open if str(path).endswith(".gz") else open
+
+    with opener(path, mode + "t", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+@pytest.mark.parametrize("mode", MODES, ids=" ".join)
+def test_modes_match(tmp_path, mapping, monkeypatch, mode):
+    rows = season_rows(tmp_path, mapping)
+    write_rows(tmp_path / "event.csv", rows)
+
+    expected = run(monkeypatch, ["event.csv"], "--boss", BOSSES)
+
+    # 按约 4 KB 的字节范围切分, 并行解析时范围边界落在带引号的字段与相同时间的团队之间
+    split_ranges = parallel.split_ranges
+    monkeypatch.setattr(
+        parallel, "split_ranges", lambda path, _: split_ranges(path, 1 << 12)
+    )
+
+    assert run(monkeypatch, ["event.csv"], "--boss", BOSSES, *mode) == expected
+
+
+def test_incremental_matches(tmp_path, mapping, monkeypatch):
+    rows = season_rows(tmp_path, mapping)
+    write_rows(tmp_path / "event.csv", rows)
+
+    expected = run(monkeypatch, ["event.csv"], "--boss", BOSSES)
+
+    # 先写入一半的记录, 追加其余记录后增量更新
+    half = len(rows) // 2
+
+    write_rows(tmp_path / "live.csv", rows[:half])
+    run(monkeypatch, ["live.csv"], "--boss", BOSSES, "--incremental")
+
+    write_rows(tmp_path / "live.csv", rows[half:], "a")
+
+    assert run(monkeypatch, ["live.csv"], "--boss", BOSSES, "--incremental") == expected
+
+
+def test_shards_match(tmp_path, mapping, monkeypatch):
+    rows = season_rows(tmp_path, mapping)
+    write_rows(tmp_path / "event.csv", rows)
+
+    expected = run(monkeypatch, ["event.csv"], "--boss", BOSSES)
+
+    # 按参数顺序拼接的分片, 含压缩文件, 分片边界可能落在同一团队的成员行之间
+    header, rows = rows[0], rows[1:]
+    inputs = ["part0.csv", "part1.csv.gz", "part2.csv"]
+    size = len(rows) // len(inputs) + 1
+
+    for i, name in enumerate(inputs):
+        write_rows(tmp_path / name, [header] + rows[i * size : (i + 1) * size])
+
+    for workers in ("1", "3"):
+        assert run(monkeypatch, inputs, "--boss", BOSSES, "-w", workers) == expected
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from robust import MAD, SELECT_MIN_SIZE, order_statistics, percentiles
+
+
+@pytest.mark.parametrize("n", [1, 31, SELECT_MIN_SIZE - 1, SELECT_MIN_SIZE * 3])
+def test_order_statistics(n):
+    rng = random.Random(n)
+    # 含大量重复值与已排序的片段
+    values = [rng.choice((rng.random(), 1.0, 2.0)) for _ in range(n)]
+    values[: n // 2] = sorted(values[: n // 2])
+
+    lst = sorted(values)
+    ks = [0, n // 4, -(n // 4), n // 2, n - 1, -1]
+
+    assert order_statistics(values, ks) == [lst[k] for k in ks]
+    assert percentiles(values, (50, 95, 99)) == [
+        lst[min(n * p // 100, n - 1)] for p in (50, 95, 99)
+    ]
+
+
+@pytest.mark.parametrize("n", [1, 31, SELECT_MIN_SIZE * 3])
+def test_mad(n):
+    rng = random.Random(n)
+    values = [rng.choice((rng.random(), 1.0, 2.0)) for _ in range(n)]
+
+    median = sorted(values)[n // 2]
+
+    assert MAD(values) == [median] * values.count(median)
+
+
+def test_script_exports():
+    # 原脚本以模块级函数提供 IQR / MAD
+    import DungeonRankAnalysis
+    import robust
+
+    assert DungeonRankAnalysis.IQR is robust.IQR
+    assert DungeonRankAnalysis.MAD is robust.MAD
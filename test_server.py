@@ -0,0 +1,39 @@
+import json
+import threading
+from urllib.request import urlopen
+
+import pytest
+
+from conftest import write_event
+from server import Dataset, QueryServer
+
+
+@pytest.fixture
+def server(tmp_path, mapping):
+    write_event(tmp_path / "event.csv")
+
+    datasets = {"event": Dataset("event", str(tmp_path / "event.csv"), mapping)}
+
+    server = QueryServer(("127.0.0.1", 0), datasets, 8)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def query(url: str) -> dict:
+    with urlopen(url) as response:
+        return json.load(response)
+
+
+def test_optional_metric(server):
+    result = query(f"{server}/query?event=event&boss=8548&metrics=lineup_count")
+
+    for group in ("all", "8548"):
+        assert result["lineup_count"][group] == {
+            "item": ["10003:1,10026:2,10028:1,10062:1", "10003:2,10028:2,10062:1"],
+            "value": [2, 1],
+        }
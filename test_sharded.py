@@ -0,0 +1,28 @@
+import pytest
+
+import sharded
+from analysis import build_index, build_response, dumps, load
+from conftest import ROSTERS, write_event
+
+
+@pytest.mark.parametrize("start_methods", [["fork", "spawn"], ["spawn"]])
+def test_sharded_response(tmp_path, mapping, monkeypatch, start_methods):
+    # 不支持 fork 时每个分片随各自的任务传入
+    monkeypatch.setattr(sharded, "get_all_start_methods", lambda: start_methods)
+
+    path = tmp_path / "event.csv"
+    write_event(path, ROSTERS * 10)
+
+    mount_group, mount_id_to_force_id, mount_id_to_mount_group = mapping
+
+    response = sharded.build_sharded_response(
+        load(str(path), mount_group, mount_id_to_force_id),
+        ["8548", "8549"],
+        mount_group,
+        mount_id_to_mount_group,
+        2,
+    )
+
+    expected = build_response(build_index(str(path), *mapping), ["8548", "8549"])
+
+    assert dumps(response) == dumps(expected)
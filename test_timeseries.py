@@ -0,0 +1,29 @@
+import csv
+
+from conftest import FIELDNAMES, ROSTERS, event_row
+from timeseries import read_leaders, sweep
+
+
+def test_numeric_finish_time(tmp_path, mapping):
+    path = tmp_path / "event.csv"
+
+    # 字符串顺序为 "1000" < "10000" < "999"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, FIELDNAMES)
+        writer.writeheader()
+
+        for team_id, finish_time in enumerate((10000, 999, 1000)):
+            row = event_row(team_id, ROSTERS[team_id])
+            row["finish_time"] = finish_time
+            writer.writerow(row)
+
+    mount_group, mount_id_to_force_id, _ = mapping
+
+    leaders = read_leaders([str(path)], mount_group, mount_id_to_force_id)
+
+    assert [leader[0] for leader in leaders] == [999, 1000, 10000]
+
+    result = sweep(leaders, ["8548"], 1)
+
+    assert result["start"] == 999
+    assert [bucket["bucket"] for bucket in result["buckets"]] == [0, 1, 9001]
@@ -0,0 +1,131 @@
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+from csv import DictReader
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from analysis import dump, load_mapping, parse_rows, rank
+from catalog import MountCatalog
+from inputs import expand_inputs, open_input
+
+# 可按时间累加的指标, 由团长行得到该团队对计数的增量
+TIMESERIES_METRICS: Dict[str, Callable[[dict], Dict]] = {
+    "server_rank_team_count": lambda line: {line["server"]: 1},
+    "mount_attendance_count": lambda line: line["mount_count"],
+}
+
+DEFAULT_INTERVAL = 3600
+
+
+def read_leaders(
+    paths: Iterable[str], mount_group: dict, mount_id_to_force_id: dict
+) -> List[Tuple[int, int, dict]]:
+    """
+    只保留团长行, 按 (finish_time, 输入顺序) 排序, 成员行不参与排序.
+    finish_time 按整数比较, 与分段的计算一致, 位数不同的时间戳也能正确排序.
+    """
+    catalog = MountCatalog(mount_group, mount_id_to_force_id)
+
+    leaders = []
+
+    for path in paths:
+        with open_input(path) as f:
+            for line in parse_rows(DictReader(f), catalog):
+                if line["is_leader"] == "1":
+                    leaders.append((int(line["finish_time"]), len(leaders), line))
+
+    leaders.sort(key=lambda leader: leader[:2])
+
+    return leaders
+
+
+def sweep(
+    leaders: List[Tuple[int, int, dict]],
+    boss_lst: List[str],
+    interval: int = DEFAULT_INTERVAL,
+    start: int | None = None,
+    metrics: Iterable[str] = tuple(TIMESERIES_METRICS),
+) -> dict:
+    """
+    一次遍历按时间段输出各指标的增量, 第 k 段为 [start + k * interval, start + (k + 1) * interval).
+    累加前 k 段的增量即为该段结束时的累计结果; 没有击杀的时间段与没有变化的 BOSS 不输出.
+    早于 start 的击杀计入第 0 段, 累计结果仍与全量一致.
+    """
+    metrics = list(metrics)
+    bosses = set(boss_lst)
+
+    if start is None:
+        start = leaders[0][0] // interval * interval if leaders else 0
+
+    buckets = []
+
+    def flush(bucket: int, delta: Dict[str, Dict[str, Counter]]) -> None:
+        buckets.append(
+            {
+                "bucket": bucket,
+                "end": start + (bucket + 1) * interval,
+                **{
+                    name: {group: rank(counter) for group, counter in groups.items()}
+                    for name, groups in delta.items()
+                },
+            }
+        )
+
+    current = None
+    delta = None
+
+    for finish_time, _, line in leaders:
+        bucket = max((finish_time - start) // interval, 0)
+
+        if bucket != current:
+            if delta is not None:
+                flush(current, delta)
+
+            current, delta = bucket, {name: defaultdict(Counter) for name in metrics}
+
+        boss = line["achieve_id"]
+        groups = ("all", boss) if boss in bosses else ("all",)
+
+        for name in metrics:
+            increment = TIMESERIES_METRICS[name](line)
+
+            for group in groups:
+                delta[name][group].update(increment)
+
+    if delta is not None:
+        flush(current, delta)
+
+    return {"start": start, "interval": interval, "buckets": buckets}
+
+
+def main() -> None:
+    parser = ArgumentParser()
+
+    parser.add_argument("-i", "--input", type=str, nargs="+", required=True)
+    parser.add_argument("-o", "--output", type=str, default="timeseries.json")
+    parser.add_argument("--boss", type=str, required=True)
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL)
+    parser.add_argument("--start", type=int, default=None)
+    parser.add_argument("--metrics", type=str, default=None)
+
+    args = parser.parse_args()
+
+    if args.interval <= 0:
+        parser.error("--interval must be a positive number of seconds")
+
+    metrics = args.metrics.split(",") if args.metrics else list(TIMESERIES_METRICS)
+
+    if unknown := set(metrics) - TIMESERIES_METRICS.keys():
+        parser.error(f"unknown metrics: {', '.join(sorted(unknown))}")
+
+    mount_group, mount_id_to_force_id, _ = load_mapping()
+
+    leaders = read_leaders(expand_inputs(args.input), mount_group, mount_id_to_force_id)
+
+    dump(
+        sweep(leaders, args.boss.split(","), args.interval, args.start, metrics),
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()